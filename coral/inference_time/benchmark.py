@@ -0,0 +1,194 @@
+# Lint as: python3
+"""Statistical inference benchmark with per stage timing.
+
+Unlike inference_time.py, which records only the invoke duration, this times
+every stage of a frame separately: decode, resize/set_input, invoke and
+get_output. Warmup frames are left out of the statistics, and the run stops
+after a fixed number of frames or a fixed duration. Images are processed in
+sorted order, or shuffled with a fixed seed, so runs on the Edge TPU and on the
+CPU see the same sequence.
+
+Results are written as JSON (summary statistics and histograms) and CSV (one
+row per measured frame).
+"""
+
+import argparse
+import csv
+import itertools
+import json
+import os
+import random
+import time
+from glob import glob
+
+from PIL import Image
+
+import detect
+import preprocess
+import stats
+import tflite_runtime.interpreter as tflite
+from inference_time import make_interpreter
+
+STAGES = ('decode', 'set_input', 'invoke', 'get_output')
+
+
+def image_order(image_files, seed=None):
+  """Returns deterministic image order, sorted or shuffled with `seed`."""
+  image_files = sorted(image_files)
+  if seed is not None:
+    random.Random(seed).shuffle(image_files)
+  return image_files
+
+
+def run_frame(session, image_file, threshold, draft_size=None, yolo=False):
+  """Runs one frame and returns (stage times in seconds, number of objects).
+
+  The image is normalized to the input dtype by the `detect.DetectorSession`.
+  With `yolo` the raw output heads of a YOLOv3 model are decoded instead of
+  reading the SSD post-processed outputs.
+  """
+  t0 = time.perf_counter()
+  size, image = preprocess.load_image(image_file, draft_size)
+  t1 = time.perf_counter()
+  scale = session.set_input(size,
+                            lambda size: image.resize(size, Image.ANTIALIAS))
+  t2 = time.perf_counter()
+  session.invoke()
+  t3 = time.perf_counter()
+  if yolo:
+    objs = session.get_yolo_output_arrays(threshold, scale)
+  else:
+    objs = session.get_output(threshold, scale)
+  t4 = time.perf_counter()
+  return (t1 - t0, t2 - t1, t3 - t2, t4 - t3), len(objs)
+
+
+def run_benchmark(session, image_files, threshold, warmup=10, count=None,
+                  duration=None, draft=False, yolo=False):
+  """Runs the benchmark, cycling over the images as needed.
+
+  Args:
+    session: `detect.DetectorSession` of an allocated interpreter.
+    image_files: images in the order they are processed.
+    threshold: score threshold for detected objects.
+    warmup: number of frames run before measuring.
+    count: number of measured frames.
+    duration: measuring time in seconds, used when `count` is None.
+    draft: decode JPEG images in draft mode.
+    yolo: decode the outputs of a YOLOv3 model.
+  Returns:
+    List of (image file, stage times, number of objects) per measured frame.
+  """
+  if count is None and duration is None:
+    raise ValueError('Either count or duration must be given')
+  draft_size = session.input_size if draft else None
+  frames = itertools.cycle(image_files)
+  for image_file in itertools.islice(frames, warmup):
+    run_frame(session, image_file, threshold, draft_size, yolo)
+
+  records = []
+  start_time = time.perf_counter()
+  for image_file in frames:
+    if count is not None and len(records) >= count:
+      break
+    if count is None and time.perf_counter() - start_time >= duration:
+      break
+    times, num_objects = run_frame(session, image_file, threshold, draft_size,
+                                   yolo)
+    records.append((image_file, times, num_objects))
+  return records
+
+
+def report(records, bins=20):
+  """Returns JSON serializable report of per stage and total statistics."""
+  columns = list(zip(*(times for _, times, _ in records))) or [()] * 4
+  samples = dict(zip(STAGES, columns))
+  samples['total'] = [sum(times) for _, times, _ in records]
+  return {name: {'summary': stats.summarize(values),
+                 'histogram': stats.histogram(values, bins)}
+          for name, values in samples.items()}
+
+
+def main():
+  parser = argparse.ArgumentParser(
+      formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+  parser.add_argument('-m', '--model', required=True,
+                      help='File path of .tflite file.')
+  parser.add_argument('-i', '--input_folder', required=True,
+                      help='File path of image folder')
+  parser.add_argument('-t', '--threshold', type=float, default=0.4,
+                      help='Score threshold for detected objects.')
+  parser.add_argument('--warmup', type=int, default=10,
+                      help='Frames run before measuring.')
+  parser.add_argument('-n', '--count', type=int, default=400,
+                      help='Number of measured frames.')
+  parser.add_argument('--duration', type=float,
+                      help='Measure for this many seconds instead of --count.')
+  parser.add_argument('--seed', type=int,
+                      help='Shuffle the images with this seed instead of '
+                           'using sorted order.')
+  parser.add_argument('--bins', type=int, default=20,
+                      help='Number of histogram bins.')
+  parser.add_argument('--cpu', action='store_true',
+                      help='Run the model on the CPU without the Edge TPU.')
+  parser.add_argument('-d', '--draft', action='store_true',
+                      help='Decode JPEG images at reduced resolution, no '
+                           'smaller than the model input.')
+  parser.add_argument('--yolo', action='store_true',
+                      help='Decode the raw output heads of a YOLOv3 or '
+                           'YOLOv3-tiny model.')
+  parser.add_argument('--mean', type=float,
+                      help='Pixel value the model maps to 0, 127.5 for float '
+                           'inputs if not given.')
+  parser.add_argument('--std', type=float,
+                      help='Pixel range the model maps to 1, 127.5 for float '
+                           'inputs if not given, e.g. 255 for YOLO.')
+  parser.add_argument('-o', '--output', default='benchmark',
+                      help='Output path prefix for the .json and .csv files.')
+  args = parser.parse_args()
+
+  if args.cpu:
+    interpreter = tflite.Interpreter(model_path=args.model.split('@')[0])
+  else:
+    interpreter = make_interpreter(args.model)
+  interpreter.allocate_tensors()
+  # Float and int8 inputs are normalized in place by the session
+  session = detect.DetectorSession(interpreter, args.mean, args.std)
+
+  image_files = image_order(
+      glob(os.path.join(os.path.expanduser(args.input_folder), "*.jpg")),
+      args.seed)
+  if not image_files:
+    raise SystemExit('No images found in ' + args.input_folder)
+  count = None if args.duration else args.count
+  records = run_benchmark(session, image_files, args.threshold,
+                          args.warmup, count, args.duration, args.draft,
+                          args.yolo)
+  result = report(records, args.bins)
+
+  with open(args.output + '.json', mode='w') as f:
+    json.dump({'model': args.model,
+               'backend': 'cpu' if args.cpu else 'edgetpu',
+               'warmup': args.warmup,
+               'frames': len(records),
+               'seed': args.seed,
+               'draft': args.draft,
+               'yolo': args.yolo,
+               'mean': args.mean,
+               'std': args.std,
+               'stages': result}, f, indent=2)
+  with open(args.output + '.csv', mode='w') as f:
+    csv_writer = csv.writer(f, delimiter=',', quotechar='"',
+                            quoting=csv.QUOTE_MINIMAL)
+    csv_writer.writerow(['frame', 'image'] + list(STAGES) + ['objects'])
+    for frame, (image_file, times, num_objects) in enumerate(records):
+      csv_writer.writerow([frame, image_file] + list(times) + [num_objects])
+
+  print(stats.format_table({name: stage['summary']
+                            for name, stage in result.items()}))
+  print("All times in ms, {} frames after {} warmup frames".format(
+      len(records), args.warmup))
+
+
+if __name__ == '__main__':
+  main()
@@ -22,12 +22,15 @@
 import argparse
 import time
 import csv
+import contextlib
 
 import os
 
-from PIL import Image, ImageDraw, ImageFont
+from PIL import ImageDraw, ImageFont
 
 import detect
+import input_cache
+import pipeline
 import tflite_runtime.interpreter as tflite
 import platform
 
@@ -82,47 +85,103 @@ def main():
                       help='File path of labels file.')
   parser.add_argument('-t', '--threshold', type=float, default=0.4,
                       help='Score threshold for detected objects.')
+  parser.add_argument('-n', '--count', type=int, default=400,
+                      help='Stop after this many images, 400 is consistent '
+                           'with the testing on Yolo.')
+  parser.add_argument('-p', '--pipeline', action='store_true',
+                      help='Decode and resize images on worker threads while '
+                           'the interpreter runs.')
+  parser.add_argument('-w', '--workers', type=int, default=2,
+                      help='Number of decode/resize workers in pipeline mode.')
+  parser.add_argument('--prefetch', type=int, default=4,
+                      help='Number of images queued ahead in pipeline mode.')
+  parser.add_argument('-d', '--draft', action='store_true',
+                      help='Decode JPEG images at reduced resolution, no '
+                           'smaller than the model input.')
+  parser.add_argument('--cache',
+                      help='Directory caching preprocessed input tensors '
+                           'between runs.')
+  parser.add_argument('--cache_size', type=int, default=256,
+                      help='Maximum size of the input cache in MB.')
+  parser.add_argument('--mean', type=float,
+                      help='Pixel value the model maps to 0, 127.5 for float '
+                           'inputs if not given.')
+  parser.add_argument('--std', type=float,
+                      help='Pixel range the model maps to 1, 127.5 for float '
+                           'inputs if not given.')
   args = parser.parse_args()
 
   labels = load_labels(args.labels) if args.labels else {}
   interpreter = make_interpreter(args.model)
   interpreter.allocate_tensors()
+  # Loaders and the cache deliver uint8 pixels, normalized by the session
+  session = detect.DetectorSession(interpreter, args.mean, args.std)
 
   
   running_average_time = 0
   image_path = os.path.join(os.path.expanduser(args.input_folder), "*.jpg")
-  print("Number of images " +  str(len(glob(image_path))))
+  image_files = glob(image_path)
+  print("Number of images " +  str(len(image_files)))
+  input_size = session.input_size
+  cache = None
+  if args.cache:
+    cache = input_cache.InputCache(args.cache, args.cache_size * 2**20)
+    width, height = input_size
+    load = input_cache.cached_loader(
+        cache, (height, width, session.input_channels), args.draft)
+  elif args.pipeline:
+    load = pipeline.eager_loader(input_size, args.draft)
+  else:
+    load = pipeline.lazy_loader(input_size if args.draft else None)
+  if args.pipeline:
+    frames = pipeline.prefetch(image_files, load, args.workers, args.prefetch)
+  else:
+    frames = pipeline.sequential(image_files, load)
   # Run Once over the entire dataset
-  with open('inference_result' + '.csv', mode='w') as accuracy_f:
+  with open('inference_result' + '.csv', mode='w') as accuracy_f, \
+       contextlib.closing(frames):
     csv_writer = csv.writer(accuracy_f, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
-    csv_writer.writerow(["Current Run: ", "Inference Time: "])
+    csv_writer.writerow(["Current Run: ", "Inference Time: ", "Preprocess Time: "])
     current_run = 0
-    for image_file in glob(image_path):
-      # Open Image using Context Manager to avoid problems with memory
-      with Image.open(image_file) as image:
-        # Images MUST be converted to RGB, any other mode causes a bug in the supplied detect.py
-        converted_img = image.convert('RGB')
-        
-        # Scale the Image
-        scale = detect.set_input(interpreter, converted_img.size,
-                                lambda size: converted_img.resize(size, Image.ANTIALIAS))
-        # Call the Interpreter and run the inference
-        start_time = time.perf_counter()
-        interpreter.invoke()
-        inference_time = time.perf_counter() - start_time
-
-        objs = detect.get_output(interpreter, args.threshold, scale)
-
-        current_run += 1
-        running_average_time += inference_time
-        csv_writer.writerow([current_run, inference_time])
-        print("Done with Image {}\n".format(current_run))
-        # Run to 400 images to be consistent with testing on Yolo
-        if current_run == 400:
-              break
+    running_preprocess_time = 0
+    # Wall clock time including decode, resize and post processing
+    run_start_time = time.perf_counter()
+    for size, resize, decode_time in frames:
+      # Scale the Image
+      set_input_start_time = time.perf_counter()
+      scale = session.set_input(size, resize)
+      preprocess_time = decode_time + time.perf_counter() - set_input_start_time
+      # Call the Interpreter and run the inference
+      start_time = time.perf_counter()
+      session.invoke()
+      inference_time = time.perf_counter() - start_time
+
+      objs = session.get_output(args.threshold, scale)
+
+      current_run += 1
+      running_average_time += inference_time
+      running_preprocess_time += preprocess_time
+      csv_writer.writerow([current_run, inference_time, preprocess_time])
+      print("Done with Image {}\n".format(current_run))
+      if current_run == args.count:
+            break
+    total_time = time.perf_counter() - run_start_time
     # Add the average inference time at the end of the csv file
     if current_run != 0:
-      csv_writer.writerow(["Average Inference Time: ", running_average_time / current_run])
+      average_time = running_average_time / current_run
+      end_to_end_fps = current_run / total_time
+      csv_writer.writerow(["Average Inference Time: ", average_time])
+      csv_writer.writerow(["Average Preprocess Time: ",
+                           running_preprocess_time / current_run])
+      csv_writer.writerow(["Invoke FPS: ", 1.0 / average_time])
+      csv_writer.writerow(["End-to-End FPS: ", end_to_end_fps])
+      print("Average Inference Time: {:.2f} ms ({:.2f} FPS), End-to-End: {:.2f} FPS, "
+            "Preprocess: {:.2f} ms"
+            .format(average_time * 1000, 1.0 / average_time, end_to_end_fps,
+                    running_preprocess_time / current_run * 1000))
+
+  if cache is not None:
+    print("Input cache hits: {}, misses: {}".format(cache.hits, cache.misses))
 
 if __name__ == '__main__':
   main()
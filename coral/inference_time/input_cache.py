@@ -0,0 +1,163 @@
+# Lint as: python3
+"""On-disk cache of preprocessed model inputs.
+
+Benchmarking several thresholds or models on the same image folder decodes and
+resizes the same images on every run. The cache stores the letterboxed uint8
+pixels of each image as a .npy file, together with the original image size and
+resize ratio, so a warm run copies a memory-mapped array into the input tensor
+instead of decoding. The pixels are normalized to the input dtype when they are
+written to the tensor, see `detect.DetectorSession.set_input`, so one entry
+serves float and quantized models of the same input shape.
+
+Entries are keyed by a hash of the image file content and the model input
+shape. The total size of the cache is bounded, the least recently used entries
+are evicted first. The entry sizes and their order are read from the directory
+once and then kept in memory, so a cache miss does not list the directory.
+"""
+
+import collections
+import hashlib
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+import preprocess
+
+Entry = collections.namedtuple('Entry', ['tensor', 'size', 'scale'])
+
+
+class InputCache:
+  """Size bounded LRU cache of letterboxed input pixels in a directory."""
+
+  def __init__(self, directory, max_bytes=256 * 2**20):
+    self.directory = os.path.expanduser(directory)
+    self.max_bytes = max_bytes
+    self.hits = 0
+    self.misses = 0
+    self._lock = threading.Lock()
+    os.makedirs(self.directory, exist_ok=True)
+    # Entry sizes in bytes from least to most recently used
+    self._index = collections.OrderedDict()
+    self._total = 0
+    self._load_index()
+
+  def _load_index(self):
+    """Reads sizes and modification times of the stored entries once."""
+    entries = []
+    for name in os.listdir(self.directory):
+      if not name.endswith('.npy'):
+        continue
+      try:
+        stat = os.stat(os.path.join(self.directory, name))
+      except FileNotFoundError:
+        continue
+      entries.append((stat.st_mtime, stat.st_size, name[:-len('.npy')]))
+    for _, nbytes, key in sorted(entries):
+      self._index[key] = nbytes
+      self._total += nbytes
+
+  @staticmethod
+  def key(image_file, shape, draft=False):
+    """Returns cache key of an image for a model input shape."""
+    digest = hashlib.sha1()
+    with open(image_file, 'rb') as f:
+      for chunk in iter(lambda: f.read(1 << 20), b''):
+        digest.update(chunk)
+    digest.update('{}|{}'.format(tuple(int(d) for d in shape),
+                                 draft).encode())
+    return digest.hexdigest()
+
+  def _paths(self, key):
+    path = os.path.join(self.directory, key)
+    return path + '.npy', path + '.json'
+
+  def get(self, key):
+    """Returns memory-mapped `Entry` for the key, or None if not cached."""
+    tensor_path, meta_path = self._paths(key)
+    try:
+      with open(meta_path, 'r') as f:
+        meta = json.load(f)
+      tensor = np.load(tensor_path, mmap_mode='r')
+      # Modification time is used as access time since the Dev Board's file
+      # systems are usually mounted with noatime
+      os.utime(tensor_path)
+    except (OSError, ValueError):
+      with self._lock:
+        self.misses += 1
+      return None
+    with self._lock:
+      self.hits += 1
+      if key in self._index:
+        self._index.move_to_end(key)
+      else:
+        # Stored by another process since the index was read
+        self._add(key, os.path.getsize(tensor_path))
+    return Entry(tensor, tuple(meta['size']), tuple(meta['scale']))
+
+  def _add(self, key, nbytes):
+    self._total += nbytes - self._index.pop(key, 0)
+    self._index[key] = nbytes
+
+  def put(self, key, tensor, size, scale):
+    """Stores letterboxed uint8 pixels and evicts entries above the limit."""
+    tensor_path, meta_path = self._paths(key)
+    suffix = '.{}.tmp'.format(threading.get_ident())
+    # Write to temporary files first so readers never see partial entries
+    with open(meta_path + suffix, 'w') as f:
+      json.dump({'size': list(size), 'scale': list(scale)}, f)
+    with open(tensor_path + suffix, 'wb') as f:
+      np.save(f, np.ascontiguousarray(tensor))
+    os.replace(meta_path + suffix, meta_path)
+    os.replace(tensor_path + suffix, tensor_path)
+    with self._lock:
+      self._add(key, os.path.getsize(tensor_path))
+    self.evict()
+
+  def evict(self):
+    """Removes least recently used entries until the cache fits its limit."""
+    with self._lock:
+      while self._total > self.max_bytes and self._index:
+        key, nbytes = self._index.popitem(last=False)
+        self._total -= nbytes
+        for path in self._paths(key):
+          try:
+            os.remove(path)
+          except FileNotFoundError:
+            pass
+
+
+def cached_loader(cache, input_shape, draft=False):
+  """Returns `pipeline` loader reading letterboxed pixels through the cache.
+
+  The loader's resize function returns uint8 pixels, which
+  `detect.DetectorSession.set_input` normalizes to the input dtype.
+
+  Args:
+    cache: `InputCache` object.
+    input_shape: model input shape as (height, width, channels) tuple.
+    draft: decode JPEG images in draft mode on cache misses.
+  """
+  height, width, channels = input_shape
+
+  def load(image_file):
+    start_time = time.perf_counter()
+    key = cache.key(image_file, input_shape, draft)
+    entry = cache.get(key)
+    if entry is None:
+      size, resized, _ = preprocess.load_resized(image_file, (width, height),
+                                                 draft)
+      w, h = resized.size
+      tensor = np.zeros(input_shape, dtype=np.uint8)
+      tensor[:h, :w] = np.reshape(resized, (h, w, channels))
+      scale = min(width / size[0], height / size[1])
+      entry = Entry(tensor, size, (scale, scale))
+      cache.put(key, *entry)
+    w, h = preprocess.fit_size(entry.size, (width, height))
+    return (entry.size,
+            lambda _: entry.tensor[:h, :w],
+            time.perf_counter() - start_time)
+
+  return load
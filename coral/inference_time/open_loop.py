@@ -0,0 +1,204 @@
+# Lint as: python3
+"""Open loop arrival simulation in front of the interpreter.
+
+The other runners are closed loop: the next image starts when the previous one
+is done. Here frames arrive on their own schedule, like from a camera, into a
+bounded queue in front of the interpreter. A frame arriving while the queue is
+full is dropped. For every processed frame the queue wait, the service time
+(set_input, invoke and get_output) and the end-to-end latency are recorded,
+all measured from the scheduled arrival time. The lag of the feeding thread
+behind the schedule is recorded separately.
+
+Arrivals follow a fixed interval or a Poisson process at a given rate, or are
+replayed from a file of recorded camera timestamps (one timestamp in seconds
+per line, the first column is used for csv lines). Images are decoded and
+resized before the run, as a camera delivers decoded frames.
+
+Given several rates and a latency budget, the highest rate whose p99
+end-to-end latency is within the budget without drops is reported.
+"""
+
+import argparse
+import os
+import queue
+import random
+import threading
+import time
+from glob import glob
+
+import detect
+import preprocess
+import stats
+import tflite_runtime.interpreter as tflite
+from inference_time import make_interpreter
+
+
+def fixed_arrivals(rate, count):
+  """Returns arrival times in seconds for a fixed frame interval."""
+  return [i / rate for i in range(count)]
+
+
+def poisson_arrivals(rate, count, seed=0):
+  """Returns arrival times in seconds of a Poisson process."""
+  generator = random.Random(seed)
+  arrivals = []
+  now = 0.0
+  for _ in range(count):
+    arrivals.append(now)
+    now += generator.expovariate(rate)
+  return arrivals
+
+
+def recorded_arrivals(path, count=None):
+  """Returns arrival times read from a timestamp file, relative to the first."""
+  timestamps = []
+  with open(path, 'r') as f:
+    for line in f:
+      field = line.split(',')[0].strip()
+      try:
+        timestamps.append(float(field))
+      except ValueError:
+        continue  # Header or empty line
+  timestamps = timestamps[:count]
+  return [t - timestamps[0] for t in timestamps] if timestamps else []
+
+
+def simulate(arrivals, service, queue_size, clock=time.perf_counter):
+  """Feeds frames into a bounded queue on their arrival times.
+
+  Args:
+    arrivals: arrival time of each frame in seconds from the start.
+    service: function processing the frame with the given index.
+    queue_size: maximum number of frames waiting for the interpreter.
+    clock: monotonic clock.
+  Returns:
+    Tuple of (list of (arrival, start, end, enqueue lag) times of processed
+    frames, number of dropped frames). The arrival is the scheduled time, so
+    a late wake-up of the feeding thread, e.g. from sleep overshoot or GIL
+    contention with the service, still counts as waiting; the enqueue lag is
+    how late the frame was put into the queue.
+  """
+  waiting = queue.Queue(maxsize=queue_size)
+  dropped = [0]
+  origin = clock()
+
+  def produce():
+    for index, arrival in enumerate(arrivals):
+      scheduled = origin + arrival
+      delay = scheduled - clock()
+      if delay > 0:
+        time.sleep(delay)
+      try:
+        waiting.put_nowait((index, scheduled, clock() - scheduled))
+      except queue.Full:
+        dropped[0] += 1
+    waiting.put(None)
+
+  producer = threading.Thread(target=produce, daemon=True)
+  producer.start()
+  records = []
+  while True:
+    item = waiting.get()
+    if item is None:
+      break
+    index, arrival, lag = item
+    start = clock()
+    service(index)
+    records.append((arrival, start, clock(), lag))
+  producer.join()
+  return records, dropped[0]
+
+
+def summarize(records, dropped):
+  """Returns dictionary of queue wait, service and end-to-end statistics."""
+  return {
+      'processed': len(records),
+      'dropped': dropped,
+      'queue_wait': stats.summarize([s - a for a, s, _, _ in records]),
+      'service': stats.summarize([e - s for _, s, e, _ in records]),
+      'end_to_end': stats.summarize([e - a for a, _, e, _ in records]),
+      'enqueue_lag': stats.summarize([lag for _, _, _, lag in records]),
+  }
+
+
+def main():
+  parser = argparse.ArgumentParser(
+      formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+  parser.add_argument('-m', '--model', required=True,
+                      help='File path of .tflite file.')
+  parser.add_argument('-i', '--input_folder', required=True,
+                      help='File path of image folder')
+  parser.add_argument('-t', '--threshold', type=float, default=0.4,
+                      help='Score threshold for detected objects.')
+  parser.add_argument('--arrivals', choices=('fixed', 'poisson', 'recorded'),
+                      default='poisson', help='Arrival process.')
+  parser.add_argument('-r', '--rates', type=float, nargs='+', default=[10.0],
+                      help='Arrival rates in frames per second.')
+  parser.add_argument('--timestamps',
+                      help='File of recorded camera timestamps, used with '
+                           '--arrivals recorded.')
+  parser.add_argument('-n', '--frames', type=int, default=400,
+                      help='Number of arriving frames per rate.')
+  parser.add_argument('-q', '--queue_size', type=int, default=4,
+                      help='Frames that can wait for the interpreter.')
+  parser.add_argument('--budget', type=float, default=100.0,
+                      help='End-to-end p99 latency budget in ms.')
+  parser.add_argument('--seed', type=int, default=0,
+                      help='Seed of the Poisson arrivals.')
+  parser.add_argument('--cpu', action='store_true',
+                      help='Run the model on the CPU without the Edge TPU.')
+  args = parser.parse_args()
+
+  if args.cpu:
+    interpreter = tflite.Interpreter(model_path=args.model.split('@')[0])
+  else:
+    interpreter = make_interpreter(args.model)
+  interpreter.allocate_tensors()
+  session = detect.DetectorSession(interpreter)
+
+  image_files = sorted(glob(os.path.join(os.path.expanduser(args.input_folder),
+                                         "*.jpg")))[:args.frames]
+  if not image_files:
+    raise SystemExit('No images found in ' + args.input_folder)
+  frames = [preprocess.load_resized(image_file, session.input_size)[:2]
+            for image_file in image_files]
+
+  def service(index):
+    size, resized = frames[index % len(frames)]
+    scale = session.set_input(size, lambda _: resized)
+    session.invoke()
+    session.get_output_arrays(args.threshold, scale)
+
+  if args.arrivals == 'recorded':
+    if not args.timestamps:
+      raise SystemExit('--arrivals recorded needs --timestamps')
+    runs = [('recorded', recorded_arrivals(args.timestamps, args.frames))]
+  elif args.arrivals == 'fixed':
+    runs = [(rate, fixed_arrivals(rate, args.frames)) for rate in args.rates]
+  else:
+    runs = [(rate, poisson_arrivals(rate, args.frames, args.seed))
+            for rate in args.rates]
+
+  print("{:>10}{:>10}{:>9}{:>12}{:>12}{:>12}{:>12}{:>10}".format(
+      "Rate", "Processed", "Dropped", "Wait p99", "Service p50", "E2E p50",
+      "E2E p99", "Lag p99"))
+  sustainable = None
+  for rate, arrivals in runs:
+    result = summarize(*simulate(arrivals, service, args.queue_size))
+    end_to_end = result['end_to_end']
+    print("{:>10}{:>10}{:>9}{:>12.2f}{:>12.2f}{:>12.2f}{:>12.2f}{:>10.2f}"
+          .format(rate, result['processed'], result['dropped'],
+                  result['queue_wait'].get('p99', 0.0) * 1000,
+                  result['service'].get('p50', 0.0) * 1000,
+                  end_to_end.get('p50', 0.0) * 1000,
+                  end_to_end.get('p99', 0.0) * 1000,
+                  result['enqueue_lag'].get('p99', 0.0) * 1000))
+    if (rate != 'recorded' and result['dropped'] == 0 and
+        end_to_end.get('p99', float('inf')) * 1000 <= args.budget):
+      sustainable = rate if sustainable is None else max(sustainable, rate)
+  print("Latency in ms. Highest rate within a {:.0f} ms p99 budget without "
+        "drops: {}".format(args.budget, sustainable))
+
+
+if __name__ == '__main__':
+  main()
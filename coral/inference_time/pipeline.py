@@ -0,0 +1,104 @@
+# Lint as: python3
+"""Image loading for the inference time runner.
+
+Frames are produced either sequentially on the calling thread, or by a pool of
+decode/resize workers feeding a bounded prefetch queue so that the interpreter
+can keep invoking while the next images are being decoded.
+
+A loader is a function taking an image path and returning a
+(size, resize, decode time) tuple, where `size` and `resize` are the arguments
+expected by `detect.set_input`.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+import preprocess
+
+
+def lazy_loader(input_size=None):
+  """Returns loader which only decodes, the resize is done inside `set_input`.
+
+  This is what the original runner did. Passing `input_size` decodes JPEG
+  images in draft mode.
+  """
+  def load(image_file):
+    start_time = time.perf_counter()
+    size, image = preprocess.load_image(image_file, input_size)
+    return (size,
+            lambda size: image.resize(size, Image.ANTIALIAS),
+            time.perf_counter() - start_time)
+  return load
+
+
+def eager_loader(input_size, draft=False):
+  """Returns loader which decodes and resizes to fit the model input."""
+  def load(image_file):
+    size, resized, decode_time = preprocess.load_resized(image_file,
+                                                         input_size, draft)
+    return size, lambda _: resized, decode_time
+  return load
+
+
+def sequential(image_files, load):
+  """Yields loaded frames, decoding on the calling thread."""
+  for image_file in image_files:
+    yield load(image_file)
+
+
+def prefetch(image_files, load, workers=2, depth=4):
+  """Yields loaded frames prepared ahead of time by a worker pool.
+
+  Frames are yielded in the order of `image_files`. At most `depth` frames are
+  queued ahead of the consumer, which bounds the memory used on the Dev Board.
+
+  Args:
+    image_files: iterable of image paths.
+    load: loader called on the worker threads, usually `eager_loader`.
+    workers: number of decode/resize threads.
+    depth: size of the prefetch queue.
+  """
+  pending = queue.Queue(maxsize=depth)
+  stop = threading.Event()
+  done = object()
+
+  def produce(executor):
+    for image_file in image_files:
+      future = executor.submit(load, image_file)
+      while not stop.is_set():
+        try:
+          pending.put(future, timeout=0.1)
+          break
+        except queue.Full:
+          continue
+      if stop.is_set():
+        future.cancel()
+        return
+    pending.put(done)
+
+  with ThreadPoolExecutor(max_workers=workers) as executor:
+    producer = threading.Thread(target=produce, args=(executor,), daemon=True)
+    producer.start()
+    try:
+      while True:
+        future = pending.get()
+        if future is done:
+          break
+        yield future.result()
+    finally:
+      # Consumer stopped early, release the producer and drop queued work
+      stop.set()
+      while True:
+        try:
+          item = pending.get_nowait()
+        except queue.Empty:
+          if not producer.is_alive():
+            break
+          producer.join(timeout=0.1)
+          continue
+        if item is not done:
+          item.cancel()
@@ -0,0 +1,56 @@
+# Lint as: python3
+"""Image decoding for the detection runners.
+
+JPEG images can be decoded at 1/2, 1/4 or 1/8 of their resolution by scaling
+in the DCT domain. In draft mode the smallest of those sizes which is still at
+least as large as the model input is used, so no pixels are decoded only to be
+thrown away by the resize.
+"""
+
+import time
+
+from PIL import Image
+
+
+def fit_size(size, input_size):
+  """Returns the (width, height) an image is resized to by `detect.set_input`."""
+  width, height = input_size
+  w, h = size
+  scale = min(width / w, height / h)
+  return int(w * scale), int(h * scale)
+
+
+def load_image(image_file, input_size=None):
+  """Decodes an image as RGB.
+
+  Args:
+    image_file: path of the image to load.
+    input_size: model input size as (width, height) tuple. When given, JPEG
+      images are decoded in draft mode at a reduced resolution.
+  Returns:
+    Tuple of (original image size, decoded RGB image). The decoded image is
+    smaller than the original size in draft mode, the original size is the one
+    to pass to `detect.set_input` so detections map to the original image.
+  """
+  with Image.open(image_file) as image:
+    size = image.size
+    if input_size is not None:
+      image.draft('RGB', fit_size(size, input_size))
+    # Images MUST be converted to RGB, any other mode causes a bug in detect.py
+    if image.mode == 'RGB':
+      image.load()
+      return size, image
+    return size, image.convert('RGB')
+
+
+def load_resized(image_file, input_size, draft=False):
+  """Decodes an image and resizes it to fit the model input.
+
+  Returns:
+    Tuple of (original image size, resized RGB image, decode and resize time
+    in seconds).
+  """
+  start_time = time.perf_counter()
+  size, image = load_image(image_file, input_size if draft else None)
+  resized = image.resize(fit_size(size, input_size), Image.ANTIALIAS)
+  return size, resized, time.perf_counter() - start_time
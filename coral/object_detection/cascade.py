@@ -0,0 +1,76 @@
+# Lint as: python3
+"""Two stage detection cascade: a cheap gate model, then the full model.
+
+The gate model runs on every frame with a low score threshold. Only when it
+reports an object of the wanted classes, e.g. a person, the frame is escalated
+to the full model, whose detections are the result. Frames the gate rejects
+have no detections. Each stage has its own model, threshold and backend, so
+both stages can run on the CPU for testing.
+"""
+
+import time
+
+import numpy as np
+from PIL import Image
+
+import detect
+import tflite_runtime.interpreter as tflite
+from run_object_detection import make_interpreter
+
+BACKENDS = ('edgetpu', 'cpu')
+
+
+def no_detections():
+  """Returns empty `detect.Detections`."""
+  return detect.Detections(boxes=np.zeros((0, 4), dtype=np.float32),
+                           scores=np.zeros((0,), dtype=np.float32),
+                           class_ids=np.zeros((0,), dtype=np.int32))
+
+
+class Stage:
+  """One model of the cascade.
+
+  Args:
+    model_file: path of the .tflite model, `model@device` selects an Edge TPU.
+    threshold: score threshold for detected objects.
+    backend: 'edgetpu' or 'cpu'.
+    class_ids: class ids to keep, None keeps every class.
+  """
+
+  def __init__(self, model_file, threshold, backend='edgetpu', class_ids=None):
+    if backend not in BACKENDS:
+      raise ValueError('Unknown backend: ' + backend)
+    if backend == 'edgetpu':
+      interpreter = make_interpreter(model_file)
+    else:
+      interpreter = tflite.Interpreter(model_path=model_file.split('@')[0])
+    interpreter.allocate_tensors()
+    self.session = detect.DetectorSession(interpreter)
+    self.threshold = threshold
+    self.class_ids = class_ids
+
+  def detect(self, size, image):
+    """Returns (`detect.Detections`, seconds spent) for a decoded image."""
+    start_time = time.perf_counter()
+    scale = self.session.set_input(
+        size, lambda size: image.resize(size, Image.ANTIALIAS))
+    self.session.invoke()
+    detections = self.session.get_output_arrays(self.threshold, scale,
+                                                self.class_ids)
+    return detections, time.perf_counter() - start_time
+
+
+class Cascade:
+  """Runs the full stage only on frames the gate stage detected objects in."""
+
+  def __init__(self, gate, full):
+    self.gate = gate
+    self.full = full
+
+  def detect(self, size, image):
+    """Returns (`detect.Detections`, seconds spent, whether it escalated)."""
+    detections, gate_time = self.gate.detect(size, image)
+    if not len(detections):
+      return no_detections(), gate_time, False
+    detections, full_time = self.full.detect(size, image)
+    return detections, gate_time + full_time, True
@@ -0,0 +1,81 @@
+# Lint as: python3
+"""Runs one image set through every available detection backend.
+
+Prints a table of latency, throughput and agreement with the first backend.
+Agreement is the Dice/F1 overlap of the detections: detections of the same
+class with IoU above --iou are matched greedily by score, and each image scores
+2 * matches / (detections in backend + detections in reference).
+"""
+
+import argparse
+import os
+import time
+from glob import glob
+
+import numpy as np
+
+import detectors
+import matching
+import preprocess
+
+
+def main():
+  parser = argparse.ArgumentParser(
+      formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+  parser.add_argument('-i', '--input_folder', required=True,
+                      help='File path of image folder')
+  parser.add_argument('--edgetpu_model',
+                      help='File path of Edge TPU compiled .tflite file.')
+  parser.add_argument('--cpu_model',
+                      help='File path of .tflite file run on the CPU.')
+  parser.add_argument('--frozen_graph',
+                      help='File path of frozen .pb graph.')
+  parser.add_argument('-t', '--threshold', type=float, default=0.4,
+                      help='Score threshold for detected objects.')
+  parser.add_argument('--iou', type=float, default=0.5,
+                      help='IoU needed for two detections to agree.')
+  parser.add_argument('-n', '--count', type=int, default=100,
+                      help='Maximum number of images.')
+  args = parser.parse_args()
+
+  backends, skipped = detectors.make_detectors(
+      args.threshold, args.edgetpu_model, args.cpu_model, args.frozen_graph)
+  for name, reason in skipped.items():
+    print("Skipping {}: {}".format(name, reason))
+  if not backends:
+    raise SystemExit('No backend available')
+
+  image_files = sorted(glob(os.path.join(os.path.expanduser(args.input_folder),
+                                         "*.jpg")))[:args.count]
+  if not image_files:
+    raise SystemExit('No images found in ' + args.input_folder)
+  latencies = {backend.name: [] for backend in backends}
+  agreements = {backend.name: [] for backend in backends}
+  for image_file in image_files:
+    _, image = preprocess.load_image(image_file)
+    reference = None
+    for backend in backends:
+      start_time = time.perf_counter()
+      detections = backend.detect(image)
+      latencies[backend.name].append(time.perf_counter() - start_time)
+      if reference is None:
+        reference = detections
+      agreements[backend.name].append(
+          matching.agreement(reference, detections, args.iou))
+  for backend in backends:
+    backend.close()
+
+  print("{:<14}{:>14}{:>14}{:>10}{:>12}".format(
+      "Backend", "Mean (ms)", "p90 (ms)", "FPS", "Agreement"))
+  for backend in backends:
+    samples = np.array(latencies[backend.name])
+    print("{:<14}{:>14.2f}{:>14.2f}{:>10.2f}{:>12.3f}".format(
+        backend.name, samples.mean() * 1000,
+        np.percentile(samples, 90) * 1000, len(samples) / samples.sum(),
+        np.mean(agreements[backend.name])))
+  print("Agreement is relative to {} over {} images".format(backends[0].name,
+                                                           len(image_files)))
+
+
+if __name__ == '__main__':
+  main()
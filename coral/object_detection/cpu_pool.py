@@ -0,0 +1,178 @@
+# Lint as: python3
+"""Process pool running a TFLite detection model on the CPU.
+
+Every worker process owns its own `tflite.Interpreter`. The interpreters are
+built from the model path, which TFLite memory-maps read-only, so all workers
+share the same pages of the model file instead of each reading a copy.
+
+The parent only hands out image paths. Each worker decodes and letterboxes its
+image straight into its own input tensor, so decoding scales with the number
+of workers instead of being limited by the parent. It then invokes and writes
+the filtered detections into a result slot in shared memory. Only paths, slot
+numbers and timings go through the queues.
+"""
+
+import multiprocessing as mp
+import time
+import traceback
+from multiprocessing import shared_memory
+
+import numpy as np
+from PIL import Image
+
+import detect
+import preprocess
+import tflite_runtime.interpreter as tflite
+
+
+def _result_dtype(max_detections):
+  return np.dtype([('boxes', np.float32, (max_detections, 4)),
+                   ('scores', np.float32, (max_detections,)),
+                   ('class_ids', np.int32, (max_detections,)),
+                   ('count', np.int32)])
+
+
+def _worker(model_file, num_threads, threshold, mean, std, slots,
+            max_detections, result_name, tasks, done):
+  """Worker process loop, exits when it receives None."""
+  result_memory = shared_memory.SharedMemory(name=result_name)
+  results = np.ndarray((slots,), dtype=_result_dtype(max_detections),
+                       buffer=result_memory.buf)
+  try:
+    interpreter = tflite.Interpreter(model_path=model_file,
+                                     num_threads=num_threads)
+    interpreter.allocate_tensors()
+    session = detect.DetectorSession(interpreter, mean, std)
+    while True:
+      task = tasks.get()
+      if task is None:
+        break
+      slot, image_file, draft = task
+      start_time = time.perf_counter()
+      size, image = preprocess.load_image(
+          image_file, session.input_size if draft else None)
+      scale = session.set_input(
+          size, lambda size: image.resize(size, Image.ANTIALIAS))
+      decode_time = time.perf_counter() - start_time
+      start_time = time.perf_counter()
+      session.invoke()
+      inference_time = time.perf_counter() - start_time
+      detections = session.get_output_arrays(threshold, scale)
+      count = len(detections)
+      results['boxes'][slot, :count] = detections.boxes
+      results['scores'][slot, :count] = detections.scores
+      results['class_ids'][slot, :count] = detections.class_ids
+      results['count'][slot] = count
+      done.put((slot, decode_time, inference_time))
+  except Exception:
+    done.put((None, traceback.format_exc(), None))
+  finally:
+    del results
+    result_memory.close()
+
+
+class CpuPool:
+  """Pool of worker processes each running one CPU interpreter.
+
+  Args:
+    model_file: path of the .tflite model.
+    workers: number of worker processes.
+    num_threads: threads used by each worker's interpreter.
+    threshold: score threshold for detected objects.
+    slots_per_worker: result slots per worker, two keeps the next image
+      queued while a worker is busy.
+    mean: pixel value the model maps to 0, see `detect.InputNormalization`.
+    std: pixel range the model maps to 1, see `detect.InputNormalization`.
+  """
+
+  def __init__(self, model_file, workers, num_threads=1, threshold=0.4,
+               slots_per_worker=2, mean=None, std=None):
+    model_file = model_file.split('@')[0]
+    # Read the output layout once in the parent
+    probe = tflite.Interpreter(model_path=model_file)
+    probe.allocate_tensors()
+    max_detections = int(probe.get_output_details()[0]['shape'][1])
+    del probe
+
+    self.slots = workers * slots_per_worker
+    result_dtype = _result_dtype(max_detections)
+    self._result_memory = shared_memory.SharedMemory(
+        create=True, size=self.slots * result_dtype.itemsize)
+    self._results = np.ndarray((self.slots,), dtype=result_dtype,
+                               buffer=self._result_memory.buf)
+
+    # Spawn instead of fork, forking after TFLite created threads is unsafe
+    context = mp.get_context('spawn')
+    self._tasks = context.Queue()
+    self._done = context.Queue()
+    self._processes = [
+        context.Process(target=_worker,
+                        args=(model_file, num_threads, threshold, mean, std,
+                              self.slots, max_detections,
+                              self._result_memory.name, self._tasks,
+                              self._done),
+                        daemon=True)
+        for _ in range(workers)
+    ]
+    for process in self._processes:
+      process.start()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    self.close()
+
+  def run(self, image_files, draft=False):
+    """Runs detection on all images.
+
+    Returns:
+      Tuple of (list of `detect.Detections`, list of invoke times in seconds,
+      list of decode and resize times in seconds), all in the order of
+      `image_files`.
+    """
+    detections = [None] * len(image_files)
+    inference_times = [None] * len(image_files)
+    decode_times = [None] * len(image_files)
+    images = iter(enumerate(image_files))
+    free = list(range(self.slots))
+    pending = {}
+    exhausted = False
+    while True:
+      while free and not exhausted:
+        item = next(images, None)
+        if item is None:
+          exhausted = True
+          break
+        index, image_file = item
+        slot = free.pop()
+        self._tasks.put((slot, image_file, draft))
+        pending[slot] = index
+      if not pending:
+        break
+      slot, decode_time, inference_time = self._done.get()
+      if slot is None:
+        raise RuntimeError('CPU worker failed:\n' + decode_time)
+      index = pending.pop(slot)
+      count = int(self._results['count'][slot])
+      detections[index] = detect.Detections(
+          boxes=self._results['boxes'][slot, :count].copy(),
+          scores=self._results['scores'][slot, :count].copy(),
+          class_ids=self._results['class_ids'][slot, :count].copy())
+      inference_times[index] = inference_time
+      decode_times[index] = decode_time
+      free.append(slot)
+    return detections, inference_times, decode_times
+
+  def close(self):
+    """Stops the workers and releases the shared memory."""
+    if self._processes is None:
+      return
+    for _ in self._processes:
+      self._tasks.put(None)
+    for process in self._processes:
+      process.join()
+    self._processes = None
+    self._results = None
+    self._result_memory.close()
+    self._result_memory.unlink()
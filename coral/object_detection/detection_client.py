@@ -0,0 +1,212 @@
+# Lint as: python3
+"""Request latency benchmark of the resident detection service.
+
+Sends the images of a folder to a running detection_server.py from a number
+of concurrent clients, each keeping its own connection open, and reports the
+latency percentiles and throughput for every concurrency level. For
+comparison the one-shot script run_object_detection.py (or the non-TPU one
+with `--cpu`) can be started once per image with `--oneshot`, which includes
+interpreter creation, delegate loading and tensor allocation in every
+request.
+"""
+
+import argparse
+import csv
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from glob import glob
+
+import stats
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+  """HTTP connection over a Unix domain socket."""
+
+  def __init__(self, path, timeout=60.0):
+    super().__init__('localhost', timeout=timeout)
+    self.path = path
+
+  def connect(self):
+    self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    self.sock.settimeout(self.timeout)
+    self.sock.connect(self.path)
+
+
+def detect(connection, image_file, send_path=False):
+  """Returns the decoded JSON response of one detection request.
+
+  Args:
+    connection: open `http.client.HTTPConnection`.
+    image_file: image to detect objects in.
+    send_path: send the path instead of the image bytes, the server must be
+      able to read the file.
+  """
+  if send_path:
+    body = json.dumps({'path': os.path.abspath(image_file)}).encode('utf-8')
+    content_type = 'application/json'
+  else:
+    with open(image_file, 'rb') as f:
+      body = f.read()
+    content_type = 'application/octet-stream'
+  connection.request('POST', '/detect', body=body,
+                     headers={'Content-Type': content_type})
+  response = connection.getresponse()
+  payload = json.loads(response.read().decode('utf-8'))
+  if response.status != 200:
+    raise RuntimeError('Request failed: {}'.format(payload.get('error')))
+  return payload
+
+
+def run_clients(connect, image_files, concurrency, requests, send_path=False):
+  """Sends `requests` detection requests from `concurrency` client threads.
+
+  Args:
+    connect: function returning a new `http.client.HTTPConnection`.
+    image_files: images sent round robin.
+    concurrency: number of clients sending at the same time.
+    requests: total number of requests.
+    send_path: send paths instead of image bytes.
+  Returns:
+    Tuple of (list of request latencies in seconds, list of server batch
+    sizes, total time in seconds).
+  """
+  lock = threading.Lock()
+  next_request = [0]
+  latencies = []
+  batches = []
+  errors = []
+
+  def client():
+    connection = connect()
+    try:
+      while not errors:
+        with lock:
+          index = next_request[0]
+          next_request[0] += 1
+        if index >= requests:
+          return
+        start_time = time.perf_counter()
+        try:
+          payload = detect(connection, image_files[index % len(image_files)],
+                           send_path)
+        except Exception as e:  # Reported on the calling thread
+          errors.append(e)
+          return
+        latency = time.perf_counter() - start_time
+        with lock:
+          latencies.append(latency)
+          batches.append(payload['batch'])
+    finally:
+      connection.close()
+
+  threads = [threading.Thread(target=client) for _ in range(concurrency)]
+  start_time = time.perf_counter()
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  total_time = time.perf_counter() - start_time
+  if errors:
+    raise errors[0]
+  return latencies, batches, total_time
+
+
+def run_oneshot(model, image_files, requests, cpu=False):
+  """Returns latencies of starting the one-shot script once per image."""
+  script = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'run_object_detection_non_tpu.py' if cpu
+                        else 'run_object_detection.py')
+  latencies = []
+  # The script writes prediction.jpg to the working directory
+  with tempfile.TemporaryDirectory() as directory:
+    for index in range(requests):
+      start_time = time.perf_counter()
+      subprocess.run([sys.executable, script, '-m', model, '-i',
+                      os.path.abspath(image_files[index % len(image_files)])],
+                     cwd=directory, check=True, stdout=subprocess.DEVNULL)
+      latencies.append(time.perf_counter() - start_time)
+  return latencies
+
+
+def main():
+  parser = argparse.ArgumentParser(
+      formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+  parser.add_argument('-i', '--input_folder', required=True,
+                      help='File path of image folder')
+  parser.add_argument('--host', default='127.0.0.1',
+                      help='Address of the detection server.')
+  parser.add_argument('-p', '--port', type=int, default=8080,
+                      help='Port of the detection server.')
+  parser.add_argument('-u', '--unix_socket',
+                      help='Unix domain socket of the detection server.')
+  parser.add_argument('-c', '--concurrency', type=int, nargs='+',
+                      default=[1, 2, 4, 8],
+                      help='Numbers of concurrent clients to sweep.')
+  parser.add_argument('-n', '--requests', type=int, default=200,
+                      help='Requests per concurrency level.')
+  parser.add_argument('--send_path', action='store_true',
+                      help='Send image paths instead of image bytes.')
+  parser.add_argument('--oneshot',
+                      help='Model file, also time the one-shot script started '
+                           'once per image with this model.')
+  parser.add_argument('--oneshot_requests', type=int, default=10,
+                      help='Number of one-shot script runs.')
+  parser.add_argument('--cpu', action='store_true',
+                      help='Use the non-TPU one-shot script.')
+  parser.add_argument('-o', '--output', default='server_latency.csv',
+                      help='File path of the result csv file.')
+  args = parser.parse_args()
+
+  image_files = sorted(glob(os.path.join(os.path.expanduser(args.input_folder),
+                                         "*.jpg")))
+  if not image_files:
+    raise SystemExit('No images found in ' + args.input_folder)
+
+  if args.unix_socket:
+    connect = lambda: UnixHTTPConnection(args.unix_socket)
+  else:
+    connect = lambda: http.client.HTTPConnection(args.host, args.port,
+                                                 timeout=60.0)
+
+  # Warm up the server and its connection handling
+  run_clients(connect, image_files, 1, min(10, args.requests), args.send_path)
+
+  rows = []
+  for concurrency in args.concurrency:
+    latencies, batches, total_time = run_clients(
+        connect, image_files, concurrency, args.requests, args.send_path)
+    rows.append((str(concurrency), stats.summarize(latencies),
+                 sum(batches) / len(batches),
+                 len(latencies) / total_time if total_time else 0.0))
+  if args.oneshot:
+    latencies = run_oneshot(args.oneshot, image_files, args.oneshot_requests,
+                            args.cpu)
+    rows.append(('one-shot', stats.summarize(latencies), 1.0,
+                 len(latencies) / sum(latencies)))
+
+  print("{:>12}{:>10}{:>10}{:>10}{:>10}{:>10}{:>10}".format(
+      "Concurrency", "Requests", "Mean", "p50", "p99", "Batch", "Req/s"))
+  with open(args.output, mode='w') as f:
+    csv_writer = csv.writer(f, delimiter=',', quotechar='"',
+                            quoting=csv.QUOTE_MINIMAL)
+    csv_writer.writerow(["Concurrency: ", "Requests: ", "Mean Latency: ",
+                         "P50 Latency: ", "P99 Latency: ", "Average Batch: ",
+                         "Requests per Second: "])
+    for name, summary, batch, throughput in rows:
+      print("{:>12}{:>10}{:>10.2f}{:>10.2f}{:>10.2f}{:>10.2f}{:>10.2f}".format(
+          name, summary['count'], summary['mean'] * 1000,
+          summary['p50'] * 1000, summary['p99'] * 1000, batch, throughput))
+      csv_writer.writerow([name, summary['count'], summary['mean'],
+                           summary['p50'], summary['p99'], batch, throughput])
+  print("Latency in ms.")
+
+
+if __name__ == '__main__':
+  main()
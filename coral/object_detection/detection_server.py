@@ -0,0 +1,278 @@
+# Lint as: python3
+"""Resident detection service.
+
+Loads the model once and serves detection requests over localhost HTTP or a
+Unix domain socket, so a client does not pay for creating the interpreter,
+loading the Edge TPU delegate and allocating tensors on every call.
+
+  POST /detect   body: image bytes, or JSON {"path": "<image file>"}
+
+The response is JSON with boxes in pixels of the original image:
+
+  {"detections": [{"id": 0, "score": 0.87,
+                   "bbox": [xmin, ymin, xmax, ymax]}],
+   "size": [width, height], "batch": 2,
+   "decode_time": 0.004, "invoke_time": 0.012}
+
+Images are decoded on the request handler threads. A single inference thread
+owns the interpreter: it takes the first waiting request, collects the ones
+arriving within the batch window (up to `max_batch`) and runs them back to
+back. The detection models take one image per invoke, so a batch saves thread
+hand offs between requests, not invokes.
+"""
+
+import argparse
+import http.server
+import io
+import json
+import os
+import queue
+import socketserver
+import threading
+import time
+
+from PIL import Image
+
+import detect
+import preprocess
+import tflite_runtime.interpreter as tflite
+from run_object_detection import make_interpreter
+
+
+class _Request:
+  """Decoded image waiting for the inference thread."""
+
+  def __init__(self, size, image):
+    self.size = size
+    self.image = image
+    self.done = threading.Event()
+    self.result = None
+    self.error = None
+
+
+class DetectionServer:
+  """Runs detection requests from many threads on one interpreter.
+
+  Args:
+    session: `detect.DetectorSession` of an allocated interpreter.
+    threshold: score threshold for detected objects.
+    max_batch: maximum number of requests run back to back.
+    batch_window: seconds to wait for more requests after the first one.
+  """
+
+  def __init__(self, session, threshold, max_batch=8, batch_window=0.002):
+    self.session = session
+    self.threshold = threshold
+    self.max_batch = max_batch
+    self.batch_window = batch_window
+    self._queue = queue.Queue()
+    self._thread = None
+
+  def submit(self, size, image):
+    """Returns (`detect.Detections`, invoke time, batch size) for an image.
+
+    Args:
+      size: original image size, see `preprocess.load_image`.
+      image: decoded RGB image.
+    """
+    request = _Request(size, image)
+    self._queue.put(request)
+    request.done.wait()
+    if request.error is not None:
+      raise request.error
+    return request.result
+
+  def _next_batch(self):
+    request = self._queue.get()
+    if request is None:
+      return None
+    batch = [request]
+    deadline = time.perf_counter() + self.batch_window
+    while len(batch) < self.max_batch:
+      timeout = deadline - time.perf_counter()
+      if timeout <= 0:
+        break
+      try:
+        request = self._queue.get(timeout=timeout)
+      except queue.Empty:
+        break
+      if request is None:
+        # Run what was collected, stop on the next call
+        self._queue.put(None)
+        break
+      batch.append(request)
+    return batch
+
+  def _run(self):
+    while True:
+      batch = self._next_batch()
+      if batch is None:
+        return
+      for request in batch:
+        try:
+          image = request.image
+          scale = self.session.set_input(
+              request.size, lambda size: image.resize(size, Image.ANTIALIAS))
+          start_time = time.perf_counter()
+          self.session.invoke()
+          invoke_time = time.perf_counter() - start_time
+          request.result = (self.session.get_output_arrays(self.threshold,
+                                                           scale),
+                            invoke_time, len(batch))
+        except Exception as e:  # Raised on the submitting thread
+          request.error = e
+        finally:
+          request.done.set()
+
+  def start(self):
+    self._thread = threading.Thread(target=self._run, daemon=True)
+    self._thread.start()
+    return self
+
+  def stop(self):
+    if self._thread is not None:
+      self._queue.put(None)
+      self._thread.join()
+      self._thread = None
+
+  def __enter__(self):
+    return self.start()
+
+  def __exit__(self, *args):
+    self.stop()
+
+
+def detections_to_json(detections):
+  """Returns list of JSON serializable dictionaries, one per detection."""
+  return [{'id': int(class_id), 'score': float(score),
+           'bbox': [float(value) for value in box]}
+          for box, score, class_id in zip(detections.boxes, detections.scores,
+                                          detections.class_ids)]
+
+
+class DetectionHandler(http.server.BaseHTTPRequestHandler):
+  """Handles POST /detect, keeping the connection open between requests."""
+  protocol_version = 'HTTP/1.1'
+
+  def do_POST(self):
+    length = int(self.headers.get('Content-Length', 0))
+    body = self.rfile.read(length)
+    if self.path != '/detect':
+      self._reply(404, {'error': 'Unknown path ' + self.path})
+      return
+    try:
+      start_time = time.perf_counter()
+      if self.headers.get('Content-Type', '').startswith('application/json'):
+        image_file = json.loads(body.decode('utf-8'))['path']
+      else:
+        image_file = io.BytesIO(body)
+      size, image = preprocess.load_image(image_file, self.server.draft_size)
+      decode_time = time.perf_counter() - start_time
+    except (OSError, ValueError, KeyError) as e:
+      self._reply(400, {'error': str(e)})
+      return
+    try:
+      detections, invoke_time, batch = self.server.detector.submit(size, image)
+    except Exception as e:  # Keep serving after a failed invoke
+      self._reply(500, {'error': str(e)})
+      return
+    self._reply(200, {'detections': detections_to_json(detections),
+                      'size': list(size), 'batch': batch,
+                      'decode_time': decode_time, 'invoke_time': invoke_time})
+
+  def _reply(self, status, payload):
+    data = json.dumps(payload).encode('utf-8')
+    self.send_response(status)
+    self.send_header('Content-Type', 'application/json')
+    self.send_header('Content-Length', str(len(data)))
+    self.end_headers()
+    self.wfile.write(data)
+
+  def log_message(self, format, *args):
+    # A log line per request would show up in the measured latency
+    pass
+
+
+class _TCPDetectionHandler(DetectionHandler):
+  # Headers and body are written separately, Nagle would delay the body
+  disable_nagle_algorithm = True
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn,
+                      socketserver.UnixStreamServer):
+  daemon_threads = True
+
+
+def make_server(detector, draft_size=None, host='127.0.0.1', port=8080,
+                unix_socket=None):
+  """Returns HTTP server passing requests to a started `DetectionServer`.
+
+  Args:
+    detector: `DetectionServer` running the requests.
+    draft_size: model input size to decode JPEG images in draft mode, or None.
+    host, port: TCP address, used when `unix_socket` is None.
+    unix_socket: path of a Unix domain socket to listen on instead.
+  """
+  if unix_socket:
+    if os.path.exists(unix_socket):
+      os.unlink(unix_socket)
+    server = _UnixHTTPServer(unix_socket, DetectionHandler)
+  else:
+    server = http.server.ThreadingHTTPServer((host, port),
+                                             _TCPDetectionHandler)
+    server.daemon_threads = True
+  server.detector = detector
+  server.draft_size = draft_size
+  return server
+
+
+def main():
+  parser = argparse.ArgumentParser(
+      formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+  parser.add_argument('-m', '--model', required=True,
+                      help='File path of .tflite file.')
+  parser.add_argument('-t', '--threshold', type=float, default=0.4,
+                      help='Score threshold for detected objects.')
+  parser.add_argument('--host', default='127.0.0.1',
+                      help='Address to listen on.')
+  parser.add_argument('-p', '--port', type=int, default=8080,
+                      help='Port to listen on.')
+  parser.add_argument('-u', '--unix_socket',
+                      help='Listen on this Unix domain socket instead of TCP.')
+  parser.add_argument('--max_batch', type=int, default=8,
+                      help='Maximum number of requests run back to back.')
+  parser.add_argument('--batch_window', type=float, default=2.0,
+                      help='Milliseconds to wait for more requests after the '
+                           'first one.')
+  parser.add_argument('-d', '--draft', action='store_true',
+                      help='Decode JPEG images at reduced resolution, no '
+                           'smaller than the model input.')
+  parser.add_argument('--cpu', action='store_true',
+                      help='Run the model on the CPU without the Edge TPU.')
+  args = parser.parse_args()
+
+  if args.cpu:
+    interpreter = tflite.Interpreter(model_path=args.model.split('@')[0])
+  else:
+    interpreter = make_interpreter(args.model)
+  interpreter.allocate_tensors()
+  session = detect.DetectorSession(interpreter)
+
+  with DetectionServer(session, args.threshold, args.max_batch,
+                       args.batch_window / 1000) as detector:
+    server = make_server(detector, session.input_size if args.draft else None,
+                         args.host, args.port, args.unix_socket)
+    print("Serving on " + (args.unix_socket or
+                           "http://{}:{}".format(args.host, args.port)))
+    try:
+      server.serve_forever()
+    except KeyboardInterrupt:
+      pass
+    finally:
+      server.server_close()
+      if args.unix_socket and os.path.exists(args.unix_socket):
+        os.unlink(args.unix_socket)
+
+
+if __name__ == '__main__':
+  main()
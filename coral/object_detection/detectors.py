@@ -0,0 +1,163 @@
+# Lint as: python3
+"""Common detector interface over the available inference backends.
+
+Every backend takes an RGB PIL image and returns `detect.Detections` with boxes
+normalized to [0, 1] relative to the image, as (xmin, ymin, xmax, ymax) rows,
+and zero based class ids. The backends are:
+
+  edgetpu: quantized TFLite model on the Edge TPU.
+  cpu: TFLite model run by the CPU interpreter.
+  frozen_graph: TF 1.x frozen graph exported by the Object Detection API, like
+    utilites/test_frozen_graph.py.
+
+Runtimes are optional, a backend whose runtime is not installed raises
+`BackendUnavailable` when it is created.
+"""
+
+import platform
+
+import numpy as np
+from PIL import Image
+
+import detect
+
+try:
+  import tflite_runtime.interpreter as tflite
+except ImportError:
+  tflite = None
+
+try:
+  import tensorflow as tf
+except ImportError:
+  tf = None
+
+
+EDGETPU_SHARED_LIB = {
+  'Linux': 'libedgetpu.so.1',
+  'Darwin': 'libedgetpu.1.dylib',
+  'Windows': 'edgetpu.dll'
+}[platform.system()]
+
+
+class BackendUnavailable(Exception):
+  """Raised when the runtime of a backend is missing."""
+
+
+def normalize(detections, size):
+  """Returns detections with boxes divided by the image (width, height)."""
+  width, height = size
+  return detect.Detections(
+      boxes=detections.boxes / np.array([width, height, width, height]),
+      scores=detections.scores,
+      class_ids=detections.class_ids)
+
+
+class Detector:
+  """Base class of the backends."""
+  name = None
+
+  def __init__(self, threshold):
+    self.threshold = threshold
+
+  def detect(self, image):
+    """Returns normalized `detect.Detections` for an RGB PIL image."""
+    raise NotImplementedError
+
+  def close(self):
+    pass
+
+
+class TFLiteDetector(Detector):
+  """TFLite detection model, on the CPU or with the Edge TPU delegate."""
+
+  def __init__(self, model_file, threshold, edgetpu=False):
+    super().__init__(threshold)
+    if tflite is None:
+      raise BackendUnavailable('tflite_runtime is not installed')
+    self.name = 'edgetpu' if edgetpu else 'cpu'
+    model_file, *device = model_file.split('@')
+    delegates = []
+    if edgetpu:
+      try:
+        delegates.append(tflite.load_delegate(
+            EDGETPU_SHARED_LIB, {'device': device[0]} if device else {}))
+      except (ValueError, OSError) as e:
+        raise BackendUnavailable('Edge TPU delegate: {}'.format(e))
+    interpreter = tflite.Interpreter(model_path=model_file,
+                                     experimental_delegates=delegates)
+    interpreter.allocate_tensors()
+    self._session = detect.DetectorSession(interpreter)
+
+  def detect(self, image):
+    scale = self._session.set_input(
+        image.size, lambda size: image.resize(size, Image.ANTIALIAS))
+    self._session.invoke()
+    return normalize(self._session.get_output_arrays(self.threshold, scale),
+                     image.size)
+
+
+class FrozenGraphDetector(Detector):
+  """TF 1.x frozen graph from the Object Detection API.
+
+  The session is kept open for the lifetime of the detector.
+  """
+  name = 'frozen_graph'
+
+  def __init__(self, model_file, threshold):
+    super().__init__(threshold)
+    if tf is None:
+      raise BackendUnavailable('tensorflow is not installed')
+    self._graph = tf.Graph()
+    with self._graph.as_default():
+      graph_def = tf.compat.v1.GraphDef()
+      with tf.io.gfile.GFile(model_file, 'rb') as f:
+        graph_def.ParseFromString(f.read())
+      tf.import_graph_def(graph_def, name='')
+    self._input = self._graph.get_tensor_by_name('image_tensor:0')
+    self._outputs = [self._graph.get_tensor_by_name(name + ':0')
+                     for name in ('detection_boxes', 'detection_classes',
+                                  'detection_scores', 'num_detections')]
+    self._session = tf.compat.v1.Session(graph=self._graph)
+
+  def detect(self, image):
+    boxes, classes, scores, count = self._session.run(
+        self._outputs, feed_dict={self._input: np.asarray(image)[None]})
+    count = int(count[0])
+    boxes, classes, scores = (boxes[0, :count], classes[0, :count],
+                              scores[0, :count])
+    keep = scores >= self.threshold
+    return detect.Detections(
+        # Normalized (ymin, xmin, ymax, xmax), reorder to BBox field order
+        boxes=boxes[keep][:, [1, 0, 3, 2]],
+        scores=scores[keep].astype(np.float32),
+        # Label map ids start at 1, TFLite SSD class ids start at 0
+        class_ids=classes[keep].astype(np.int32) - 1)
+
+  def close(self):
+    self._session.close()
+
+
+def make_detectors(threshold, edgetpu_model=None, cpu_model=None,
+                   frozen_graph=None):
+  """Returns (list of detectors, dictionary of skipped backend reasons).
+
+  Backends without a model file are left out, backends whose runtime is
+  missing are skipped with the reason.
+  """
+  factories = [
+      ('edgetpu', edgetpu_model,
+       lambda model: TFLiteDetector(model, threshold, edgetpu=True)),
+      ('cpu', cpu_model, lambda model: TFLiteDetector(model, threshold)),
+      ('frozen_graph', frozen_graph,
+       lambda model: FrozenGraphDetector(model, threshold)),
+  ]
+  detectors = []
+  skipped = {}
+  for name, model, factory in factories:
+    if not model:
+      continue
+    try:
+      detectors.append(factory(model))
+    except BackendUnavailable as e:
+      skipped[name] = str(e)
+  return detectors, skipped
@@ -0,0 +1,206 @@
+# Lint as: python3
+"""Shared memory ring buffer of frames between a capture and a detector process.
+
+The ring holds a fixed number of slots, each laid out like the model input
+tensor, so a frame is letterboxed straight into its slot by the producer and
+copied once from the slot into the input tensor by the consumer. Slots usually
+hold uint8 pixels which the consumer normalizes to the input dtype during that
+copy, see `read` and `detect.DetectorSession.write_frame`. Only the slot
+headers are touched under the lock, the frame copies run outside of it.
+
+The policy is drop-oldest: the producer always writes into the oldest slot the
+consumer is not reading, overwriting frames that were never read, and the
+consumer always takes the newest complete frame. Every frame carries a
+sequence number, so the consumer sees how many frames it missed.
+
+The creating process owns the shared memory and unlinks it in `release`. Other
+processes attach with `FrameRing(**ring.spec())`, the spec can be passed as
+arguments of a spawned process.
+"""
+
+import collections
+import multiprocessing as mp
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+Frame = collections.namedtuple('Frame', ['sequence', 'size', 'scale',
+                                         'timestamp', 'skipped'])
+
+_SLOT_DTYPE = np.dtype([('sequence', np.int64),
+                        ('width', np.int32),
+                        ('height', np.int32),
+                        ('scale', np.float64),
+                        ('timestamp', np.float64)])
+
+_STATE_DTYPE = np.dtype([('next_sequence', np.int64),
+                         ('reading', np.int32),
+                         ('closed', np.int32)])
+
+
+class FrameRing:
+  """Fixed size frame slots in shared memory.
+
+  Args:
+    input_shape: (height, width, channels) of the model input.
+    dtype: dtype of the slots, uint8 for pixels normalized on read.
+    slots: number of frame slots, at least 3 so the producer always has a
+      slot to write while the consumer reads one and another one is ready.
+    name: shared memory name to attach to, None creates a new ring.
+    condition: `multiprocessing.Condition` of an existing ring.
+  """
+
+  def __init__(self, input_shape, dtype, slots=3, name=None, condition=None):
+    if slots < 3:
+      raise ValueError('A frame ring needs at least 3 slots')
+    self.input_shape = tuple(int(d) for d in input_shape)
+    self.dtype = np.dtype(dtype)
+    self.slots = slots
+    frame_bytes = int(np.prod(self.input_shape)) * self.dtype.itemsize
+    header_bytes = _STATE_DTYPE.itemsize + slots * _SLOT_DTYPE.itemsize
+    # Frames start on a cache line boundary
+    self._frames_offset = -(-header_bytes // 64) * 64
+    self._owner = name is None
+    if self._owner:
+      self._memory = shared_memory.SharedMemory(
+          create=True, size=self._frames_offset + slots * frame_bytes)
+      self._condition = mp.get_context('spawn').Condition()
+    else:
+      self._memory = shared_memory.SharedMemory(name=name)
+      self._condition = condition
+    buf = self._memory.buf
+    self._state = np.ndarray((), dtype=_STATE_DTYPE, buffer=buf)
+    self._headers = np.ndarray((slots,), dtype=_SLOT_DTYPE, buffer=buf,
+                               offset=_STATE_DTYPE.itemsize)
+    self._frames = np.ndarray((slots,) + self.input_shape, dtype=self.dtype,
+                              buffer=buf, offset=self._frames_offset)
+    # Padding already cleared in each slot, like `detect.DetectorSession`
+    self._filled = [(0, 0)] * slots
+    if self._owner:
+      self._state['next_sequence'] = 0
+      self._state['reading'] = -1
+      self._state['closed'] = 0
+      self._headers['sequence'] = -1
+      self._frames.fill(0)
+
+  def spec(self):
+    """Returns keyword arguments attaching another process to this ring."""
+    return {'input_shape': self.input_shape, 'dtype': self.dtype.str,
+            'slots': self.slots, 'name': self._memory.name,
+            'condition': self._condition}
+
+  def write(self, size, resize, timestamp=None):
+    """Letterboxes a frame into the oldest free slot and publishes it.
+
+    Args:
+      size: original frame size as (width, height).
+      resize: function resizing the frame to the given (width, height), like
+        the `resize` argument of `detect.set_input`.
+      timestamp: capture time, `time.time()` by default.
+    Returns:
+      Sequence number of the frame.
+    """
+    if timestamp is None:
+      timestamp = time.time()
+    with self._condition:
+      sequences = self._headers['sequence'].copy()
+      reading = int(self._state['reading'])
+      if reading >= 0:
+        sequences[reading] = np.iinfo(np.int64).max
+      slot = int(np.argmin(sequences))
+      # Unpublished while it is written, the consumer skips it
+      self._headers['sequence'][slot] = -1
+
+    height, width, channels = self.input_shape
+    w, h = size
+    scale = min(width / w, height / h)
+    w, h = int(w * scale), int(h * scale)
+    tensor = self._frames[slot]
+    tensor[:h, :w] = np.asarray(resize((w, h))).reshape(h, w, channels)
+    filled_w, filled_h = self._filled[slot]
+    if filled_h > h:
+      tensor[h:filled_h, :filled_w] = 0
+    if filled_w > w:
+      tensor[:min(h, filled_h), w:filled_w] = 0
+    self._filled[slot] = (w, h)
+
+    with self._condition:
+      sequence = int(self._state['next_sequence'])
+      self._state['next_sequence'] = sequence + 1
+      header = self._headers[slot]
+      header['width'], header['height'] = size
+      header['scale'] = scale
+      header['timestamp'] = timestamp
+      header['sequence'] = sequence
+      self._condition.notify_all()
+    return sequence
+
+  def read_into(self, tensor, last_sequence=-1, timeout=None):
+    """Copies the newest frame after `last_sequence` into `tensor`.
+
+    Args:
+      tensor: array of the input shape and the slot dtype. Writing the whole
+        input tensor of a `DetectorSession` invalidates its tracked padding,
+        call its `reset` before using its `set_input` again.
+      last_sequence: sequence number of the previously read frame.
+      timeout: seconds to wait for a new frame, None waits until one arrives.
+    Returns:
+      `Frame`, or None after `close` or when the timeout expired.
+    """
+    return self.read(lambda frame: np.copyto(tensor, frame), last_sequence,
+                     timeout)
+
+  def read(self, write, last_sequence=-1, timeout=None):
+    """Hands the newest frame after `last_sequence` to `write`.
+
+    Args:
+      write: function called with the slot array while the producer keeps
+        off the slot, e.g. `DetectorSession.write_frame` which normalizes the
+        pixels into the input tensor. The slot must not be used afterwards.
+      last_sequence: sequence number of the previously read frame.
+      timeout: seconds to wait for a new frame, None waits until one arrives.
+    Returns:
+      `Frame`, or None after `close` or when the timeout expired.
+    """
+    with self._condition:
+      while True:
+        sequences = self._headers['sequence']
+        slot = int(np.argmax(sequences))
+        if sequences[slot] > last_sequence:
+          break
+        if self._state['closed'] or not self._condition.wait(timeout):
+          return None
+      header = self._headers[slot].copy()
+      self._state['reading'] = slot
+    try:
+      write(self._frames[slot])
+    finally:
+      with self._condition:
+        self._state['reading'] = -1
+    sequence = int(header['sequence'])
+    return Frame(sequence, (int(header['width']), int(header['height'])),
+                 (float(header['scale']),) * 2, float(header['timestamp']),
+                 sequence - last_sequence - 1)
+
+  def close(self):
+    """Tells the consumer that no more frames will be written."""
+    with self._condition:
+      self._state['closed'] = 1
+      self._condition.notify_all()
+
+  def release(self):
+    """Detaches from the shared memory, the creating process unlinks it."""
+    if self._memory is None:
+      return
+    self._state = self._headers = self._frames = None
+    self._memory.close()
+    if self._owner:
+      self._memory.unlink()
+    self._memory = None
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    self.release()
@@ -0,0 +1,272 @@
+# Lint as: python3
+"""Compares frame transports between a capture process and the detector.
+
+A producer process plays the role of the camera: it releases decoded images at
+`--fps` (or as fast as it can) and hands them to the detector process, either
+through a `frame_ring.FrameRing` or pickled through a `multiprocessing.Queue`
+of the same depth. Both transports drop the oldest frame when the detector
+falls behind.
+
+Per frame the transfer time (from capture until the frame is in the input
+tensor), the end-to-end latency (from capture until the detections are
+available) and the number of skipped frames are reported. The number of full
+frame copies follows from the transport and is printed as a nominal count, it
+is not measured:
+
+  ring: letterbox into the slot, slot into the input tensor (2).
+  queue: letterbox into an array, pickle, pipe write, pipe read, unpickle,
+    array into the input tensor (6).
+
+With `--allocations` the memory the detector process allocates per frame while
+receiving it and writing it to the input tensor is measured with tracemalloc,
+as the peak in units of the frame size. Tracing slows the detector down, so the
+latencies of such a run are not comparable with an untraced one.
+
+Both transports carry uint8 pixels, which are normalized to the input dtype
+while they are copied into the input tensor.
+"""
+
+import argparse
+import multiprocessing as mp
+import os
+import queue
+import time
+import tracemalloc
+from glob import glob
+
+import numpy as np
+from PIL import Image
+
+import detect
+import frame_ring
+import preprocess
+import stats
+import tflite_runtime.interpreter as tflite
+from run_object_detection import make_interpreter
+
+# Nominal full frame copies per frame, see the module documentation
+COPIES = {'ring': 2, 'queue': 6}
+
+
+def _allocated():
+  """Returns peak bytes allocated since the last call, None without tracing.
+
+  Restarting the traces resets the peak, which also works before Python 3.9.
+  """
+  if not tracemalloc.is_tracing():
+    return None
+  _, peak = tracemalloc.get_traced_memory()
+  tracemalloc.clear_traces()
+  return peak
+
+
+def _capture(image_files, frames, fps, emit):
+  """Releases decoded frames at `fps`, calling `emit(size, image)`."""
+  images = [preprocess.load_image(image_file) for image_file in image_files]
+  period = 1.0 / fps if fps else 0.0
+  deadline = time.perf_counter()
+  for index in range(frames):
+    delay = deadline - time.perf_counter()
+    if delay > 0:
+      time.sleep(delay)
+    deadline += period
+    size, image = images[index % len(images)]
+    emit(size, image)
+
+
+def _produce_ring(spec, image_files, frames, fps):
+  ring = frame_ring.FrameRing(**spec)
+  try:
+    _capture(image_files, frames, fps,
+             lambda size, image: ring.write(
+                 size, lambda s: image.resize(s, Image.ANTIALIAS)))
+  finally:
+    ring.close()
+    ring.release()
+
+
+def _produce_queue(frame_queue, input_shape, image_files, frames, fps):
+  height, width, channels = input_shape
+  sequence = [0]
+
+  def emit(size, image):
+    timestamp = time.time()
+    w, h = preprocess.fit_size(size, (width, height))
+    tensor = np.zeros(input_shape, dtype=np.uint8)
+    tensor[:h, :w] = np.reshape(image.resize((w, h), Image.ANTIALIAS),
+                                (h, w, channels))
+    scale = min(width / size[0], height / size[1])
+    item = (sequence[0], timestamp, (scale, scale), tensor)
+    sequence[0] += 1
+    try:
+      frame_queue.put_nowait(item)
+    except queue.Full:
+      # Drop the oldest frame to make room
+      try:
+        frame_queue.get_nowait()
+      except queue.Empty:
+        pass
+      frame_queue.put(item)
+
+  try:
+    _capture(image_files, frames, fps, emit)
+  finally:
+    frame_queue.put(None)
+
+
+def consume_ring(ring, session, threshold):
+  """Runs detection on frames from the ring until it is closed.
+
+  Returns:
+    List of (transfer time, end-to-end latency, skipped frames, bytes
+    allocated by the transfer or None without tracing) per frame.
+  """
+  records = []
+  last_sequence = -1
+  while True:
+    _allocated()
+    frame = ring.read(session.write_frame, last_sequence)
+    if frame is None:
+      return records
+    transferred = time.time()
+    allocated = _allocated()
+    session.invoke()
+    session.get_output_arrays(threshold, frame.scale)
+    records.append((transferred - frame.timestamp,
+                    time.time() - frame.timestamp, frame.skipped, allocated))
+    last_sequence = frame.sequence
+
+
+def consume_queue(frame_queue, session, threshold):
+  """Same as `consume_ring` for frames pickled through a queue."""
+  records = []
+  last_sequence = -1
+  while True:
+    _allocated()
+    item = frame_queue.get()
+    if item is None:
+      return records
+    sequence, timestamp, scale, tensor = item
+    session.write_frame(tensor)
+    transferred = time.time()
+    allocated = _allocated()
+    del item, tensor
+    session.invoke()
+    session.get_output_arrays(threshold, scale)
+    records.append((transferred - timestamp, time.time() - timestamp,
+                    sequence - last_sequence - 1, allocated))
+    last_sequence = sequence
+
+
+def run(transport, session, image_files, frames, fps, threshold, slots,
+        allocations=False):
+  """Runs one transport, returns list of per frame records.
+
+  With `allocations` the detector process is traced with tracemalloc.
+  """
+  # Spawn instead of fork, forking after TFLite created threads is unsafe
+  context = mp.get_context('spawn')
+  width, height = session.input_size
+  input_shape = (height, width, session.input_channels)
+  if allocations:
+    tracemalloc.start()
+  try:
+    return _run(context, transport, session, input_shape, image_files, frames,
+                fps, threshold, slots)
+  finally:
+    if allocations:
+      tracemalloc.stop()
+
+
+def _run(context, transport, session, input_shape, image_files, frames, fps,
+         threshold, slots):
+  if transport == 'ring':
+    with frame_ring.FrameRing(input_shape, np.uint8, slots) as ring:
+      producer = context.Process(target=_produce_ring,
+                                 args=(ring.spec(), image_files, frames, fps),
+                                 daemon=True)
+      producer.start()
+      records = consume_ring(ring, session, threshold)
+      producer.join()
+  else:
+    frame_queue = context.Queue(maxsize=slots)
+    producer = context.Process(target=_produce_queue,
+                               args=(frame_queue, input_shape, image_files,
+                                     frames, fps),
+                               daemon=True)
+    producer.start()
+    records = consume_queue(frame_queue, session, threshold)
+    producer.join()
+  return records
+
+
+def main():
+  parser = argparse.ArgumentParser(
+      formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+  parser.add_argument('-m', '--model', required=True,
+                      help='File path of .tflite file.')
+  parser.add_argument('-i', '--input_folder', required=True,
+                      help='File path of image folder')
+  parser.add_argument('-t', '--threshold', type=float, default=0.4,
+                      help='Score threshold for detected objects.')
+  parser.add_argument('-n', '--frames', type=int, default=400,
+                      help='Number of captured frames per transport.')
+  parser.add_argument('-f', '--fps', type=float, default=30.0,
+                      help='Capture rate, 0 captures as fast as possible.')
+  parser.add_argument('-s', '--slots', type=int, default=3,
+                      help='Ring slots and queue depth.')
+  parser.add_argument('--transports', nargs='+', choices=('ring', 'queue'),
+                      default=['ring', 'queue'],
+                      help='Transports to compare.')
+  parser.add_argument('--mean', type=float,
+                      help='Pixel value the model maps to 0, 127.5 for float '
+                           'inputs if not given.')
+  parser.add_argument('--std', type=float,
+                      help='Pixel range the model maps to 1, 127.5 for float '
+                           'inputs if not given.')
+  parser.add_argument('--allocations', action='store_true',
+                      help='Measure the memory allocated per received frame '
+                           'with tracemalloc, slows the detector down.')
+  parser.add_argument('--cpu', action='store_true',
+                      help='Run the model on the CPU without the Edge TPU.')
+  args = parser.parse_args()
+
+  if args.cpu:
+    interpreter = tflite.Interpreter(model_path=args.model.split('@')[0])
+  else:
+    interpreter = make_interpreter(args.model)
+  interpreter.allocate_tensors()
+  session = detect.DetectorSession(interpreter, args.mean, args.std)
+
+  image_files = sorted(glob(os.path.join(os.path.expanduser(args.input_folder),
+                                         "*.jpg")))[:args.frames]
+  if not image_files:
+    raise SystemExit('No images found in ' + args.input_folder)
+
+  frame_bytes = int(np.prod(session.input_tensor().shape))
+  print("{:>10}{:>10}{:>10}{:>9}{:>14}{:>14}{:>12}{:>12}{:>10}".format(
+      "Transport", "Nominal", "Processed", "Skipped", "Transfer p50",
+      "Transfer p99", "E2E p50", "E2E p99", "Allocated"))
+  for transport in args.transports:
+    records = run(transport, session, image_files, args.frames, args.fps,
+                  args.threshold, args.slots, args.allocations)
+    transfer = stats.summarize([r[0] for r in records])
+    end_to_end = stats.summarize([r[1] for r in records])
+    allocated = [r[3] for r in records if r[3] is not None]
+    print("{:>10}{:>10}{:>10}{:>9}{:>14.2f}{:>14.2f}{:>12.2f}{:>12.2f}{:>10}"
+          .format(transport, COPIES[transport], len(records),
+                  sum(r[2] for r in records),
+                  transfer.get('p50', 0.0) * 1000,
+                  transfer.get('p99', 0.0) * 1000,
+                  end_to_end.get('p50', 0.0) * 1000,
+                  end_to_end.get('p99', 0.0) * 1000,
+                  '{:.2f}'.format(np.mean(allocated) / frame_bytes)
+                  if allocated else '-'))
+  print("Latency in ms. Nominal is the number of full frame copies per frame "
+        "implied by the transport, not measured.")
+  if args.allocations:
+    print("Allocated is the measured mean peak memory allocated by the "
+          "detector per received frame, in uint8 frames.")
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,35 @@
+# Lint as: python3
+"""Matching detections of two runs on the same image.
+
+Detections of the same class with IoU above a threshold are matched greedily
+by the score of the reference detections. Only needs NumPy and detect.py, so
+it can be imported on the Dev Board without TensorFlow.
+"""
+
+import numpy as np
+
+import detect
+
+
+def match_count(reference, detections, iou_threshold=0.5):
+  """Returns number of reference detections matched by `detections`."""
+  if len(reference) == 0 or len(detections) == 0:
+    return 0
+  iou = detect.BoxArray.iou(detect.BoxArray(reference.boxes),
+                            detect.BoxArray(detections.boxes))
+  iou[reference.class_ids[:, None] != detections.class_ids[None, :]] = 0.0
+  matches = 0
+  for row in np.argsort(-reference.scores, kind='stable'):
+    column = int(np.argmax(iou[row]))
+    if iou[row, column] >= iou_threshold:
+      matches += 1
+      iou[:, column] = 0.0
+  return matches
+
+
+def agreement(reference, detections, iou_threshold=0.5):
+  """Returns F1 overlap of two normalized `detect.Detections`."""
+  if len(reference) == 0 and len(detections) == 0:
+    return 1.0
+  return (2.0 * match_count(reference, detections, iou_threshold) /
+          (len(reference) + len(detections)))
@@ -0,0 +1,83 @@
+# Lint as: python3
+"""Cheap change detection deciding whether a frame needs the detector.
+
+Frames are reduced to a small grayscale copy and compared block by block with
+the reference frame, the last frame the detector ran on. A block changed when
+the mean absolute difference of its pixels is above `pixel_threshold`, and the
+frame changed when more than `min_changed` of the blocks did. Comparing with
+the last detected frame instead of the previous one lets slow changes add up
+until they trigger the detector.
+"""
+
+import numpy as np
+from PIL import Image
+
+
+def gray(image, size):
+  """Returns `image` reduced to a uint8 grayscale array of (width, height)."""
+  return np.asarray(image.resize(size, Image.BILINEAR).convert('L'))
+
+
+def changed_blocks(current, reference, block=8, pixel_threshold=15):
+  """Returns boolean array telling which blocks changed.
+
+  Args:
+    current: grayscale frame as 2D uint8 array.
+    reference: grayscale frame of the same shape.
+    block: side of the square blocks in pixels, the frame is cropped to a
+      multiple of it.
+    pixel_threshold: mean absolute pixel difference of a changed block.
+  """
+  rows, columns = current.shape[0] // block, current.shape[1] // block
+  height, width = rows * block, columns * block
+  difference = np.abs(current[:height, :width].astype(np.int16) -
+                      reference[:height, :width])
+  means = difference.reshape(rows, block, columns, block).mean(axis=(1, 3))
+  return means > pixel_threshold
+
+
+class MotionGate:
+  """Decides per frame whether the detector has to run.
+
+  Args:
+    size: (width, height) of the grayscale copy.
+    block: side of the compared blocks in pixels of the grayscale copy.
+    pixel_threshold: mean absolute pixel difference of a changed block.
+    min_changed: fraction of blocks that has to change to run the detector.
+    max_skip: run the detector after this many skipped frames regardless of
+      motion, None never forces it.
+  """
+
+  def __init__(self, size=(160, 120), block=8, pixel_threshold=15,
+               min_changed=0.01, max_skip=None):
+    self.size = size
+    self.block = block
+    self.pixel_threshold = pixel_threshold
+    self.min_changed = min_changed
+    self.max_skip = max_skip
+    self.mask = None
+    self._reference = None
+    self._skipped = 0
+
+  def should_run(self, image):
+    """Returns whether the detector has to run on `image`.
+
+    When it returns True the frame becomes the new reference, the caller is
+    expected to run the detector on it.
+    """
+    current = gray(image, self.size)
+    if self._reference is None:
+      run = True
+      self.mask = np.ones((self.size[1] // self.block,
+                           self.size[0] // self.block), dtype=bool)
+    else:
+      self.mask = changed_blocks(current, self._reference, self.block,
+                                 self.pixel_threshold)
+      forced = self.max_skip is not None and self._skipped >= self.max_skip
+      run = forced or bool(self.mask.mean() > self.min_changed)
+    if run:
+      self._reference = current
+      self._skipped = 0
+    else:
+      self._skipped += 1
+    return run
@@ -28,6 +28,7 @@ from os.path import isfile, join
 from PIL import Image, ImageDraw, ImageFont
 
 import detect
+import preprocess
 import tflite_runtime.interpreter as tflite
 import platform
 
@@ -87,6 +88,9 @@ def main():
                       help='File path of labels file.')
   parser.add_argument('-t', '--threshold', type=float, default=0.4,
                       help='Score threshold for detected objects.')
+  parser.add_argument('-d', '--draft', action='store_true',
+                      help='Decode JPEG images at reduced resolution, no '
+                           'smaller than the model input.')
   args = parser.parse_args()
 
   labels = load_labels(args.labels) if args.labels else {}
@@ -94,18 +98,23 @@ def main():
   interpreter.allocate_tensors()
 
   # Open Image from input argument
-  image = Image.open(args.input)
-  image = image.convert('RGB')
+  start_time = time.perf_counter()
+  size, image = preprocess.load_image(
+      args.input, detect.input_size(interpreter) if args.draft else None)
   #Scale Each Image
-  scale = detect.set_input(interpreter, image.size,
+  scale = detect.set_input(interpreter, size,
                             lambda size: image.resize(size, Image.ANTIALIAS))
+  print("Decode and resize took {:.2f} ms".format(
+      (time.perf_counter() - start_time) * 1000))
   # Call the Interpreter and run the inference
   interpreter.invoke()
   objs = detect.get_output(interpreter, args.threshold, scale)
     
-  # Loop over every detected object
+  # Loop over every detected object, boxes are relative to the original size
+  sx, sy = image.width / size[0], image.height / size[1]
   for obj in objs:
-    draw_object(ImageDraw.Draw(image), obj, labels)
+    draw_object(ImageDraw.Draw(image), obj._replace(bbox=obj.bbox.scale(sx, sy)),
+                labels)
       
   image.save("prediction.jpg")
   print("Detected {} people in the image".format(len(objs)))
@@ -0,0 +1,115 @@
+# Lint as: python3
+"""Compares a two stage cascade with running the full model alone.
+
+Every image goes through the cascade and through the full model alone. Reports
+the escalation rate, the latency distribution of both, and the recall of the
+cascade against the full model: the fraction of the full model's detections
+the cascade also returns, and the fraction of images with detections that were
+escalated.
+
+Example running both stages on the CPU:
+
+  python3 run_object_detection_cascade.py -i images \
+      --gate_model ssd_mobilenet_v2_tiny.tflite --gate_backend cpu \
+      --full_model ssd_mobilenet_v2.tflite --full_backend cpu
+"""
+
+import argparse
+import csv
+import os
+from glob import glob
+
+import numpy as np
+
+import cascade
+import matching
+import preprocess
+import stats
+
+
+def main():
+  parser = argparse.ArgumentParser(
+      formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+  parser.add_argument('-i', '--input_folder', required=True,
+                      help='File path of image folder')
+  parser.add_argument('--gate_model', required=True,
+                      help='File path of the cheap .tflite model.')
+  parser.add_argument('--gate_threshold', type=float, default=0.2,
+                      help='Score threshold of the gate model.')
+  parser.add_argument('--gate_backend', choices=cascade.BACKENDS,
+                      default='edgetpu', help='Backend of the gate model.')
+  parser.add_argument('--full_model', required=True,
+                      help='File path of the full .tflite model.')
+  parser.add_argument('--full_threshold', type=float, default=0.4,
+                      help='Score threshold of the full model.')
+  parser.add_argument('--full_backend', choices=cascade.BACKENDS,
+                      default='edgetpu', help='Backend of the full model.')
+  parser.add_argument('-c', '--class_ids', type=int, nargs='*', default=[0],
+                      help='Class ids escalated and kept, none keeps every '
+                           'class.')
+  parser.add_argument('--iou', type=float, default=0.5,
+                      help='IoU needed for two detections to match.')
+  parser.add_argument('-n', '--count', type=int, default=400,
+                      help='Maximum number of images.')
+  parser.add_argument('-d', '--draft', action='store_true',
+                      help='Decode JPEG images at reduced resolution, no '
+                           'smaller than the full model input.')
+  parser.add_argument('-o', '--output', default='cascade_result.csv',
+                      help='File path of the per image result csv file.')
+  args = parser.parse_args()
+
+  class_ids = args.class_ids or None
+  gate = cascade.Stage(args.gate_model, args.gate_threshold,
+                       args.gate_backend, class_ids)
+  full = cascade.Stage(args.full_model, args.full_threshold,
+                       args.full_backend, class_ids)
+  runner = cascade.Cascade(gate, full)
+
+  image_files = sorted(glob(os.path.join(os.path.expanduser(args.input_folder),
+                                         "*.jpg")))[:args.count]
+  if not image_files:
+    raise SystemExit('No images found in ' + args.input_folder)
+  draft_size = full.session.input_size if args.draft else None
+
+  # Warm up both models before timing
+  size, image = preprocess.load_image(image_files[0], draft_size)
+  gate.detect(size, image)
+  full.detect(size, image)
+
+  rows = []
+  for image_file in image_files:
+    size, image = preprocess.load_image(image_file, draft_size)
+    detections, cascade_time, escalated = runner.detect(size, image)
+    reference, full_time = full.detect(size, image)
+    rows.append((os.path.basename(image_file), escalated, cascade_time,
+                 full_time, len(detections), len(reference),
+                 matching.match_count(reference, detections, args.iou)))
+
+  with open(args.output, mode='w') as f:
+    csv_writer = csv.writer(f, delimiter=',', quotechar='"',
+                            quoting=csv.QUOTE_MINIMAL)
+    csv_writer.writerow(["Image: ", "Escalated: ", "Cascade Time: ",
+                         "Full Model Time: ", "Detections: ",
+                         "Full Model Detections: ", "Matched: "])
+    csv_writer.writerows(rows)
+
+  escalated = np.array([row[1] for row in rows])
+  references = np.array([row[5] for row in rows])
+  matched = sum(row[6] for row in rows)
+  print("Images {}, escalated {} ({:.1f} %)".format(
+      len(rows), int(escalated.sum()), 100.0 * escalated.mean()))
+  print(stats.format_table({
+      'cascade': stats.summarize([row[2] for row in rows]),
+      'full': stats.summarize([row[3] for row in rows])}))
+  print("Latency in ms.")
+  if references.sum():
+    print("Recall against the full model: {:.3f} of detections, {:.3f} of "
+          "images with detections escalated".format(
+              matched / references.sum(),
+              escalated[references > 0].mean()))
+  else:
+    print("The full model detected nothing, recall is undefined")
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,135 @@
+# Lint as: python3
+"""Runs detection on a stream only when the frame changed.
+
+`motion.MotionGate` compares a small grayscale copy of each frame with the
+last frame the detector ran on, before anything is written to the input
+tensor. Static frames reuse the previous detections. Reports the invokes
+skipped and the time spent in the gate, and with `--compare` the accuracy cost:
+the F1 agreement and count drift of the reused detections against running the
+detector on every frame of the recorded sequence.
+"""
+
+import argparse
+import csv
+import time
+
+import numpy as np
+from PIL import Image
+
+import detect
+import matching
+import motion
+import stream
+import tflite_runtime.interpreter as tflite
+from run_object_detection import make_interpreter
+
+
+def main():
+  parser = argparse.ArgumentParser(
+      formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+  parser.add_argument('-m', '--model', required=True,
+                      help='File path of .tflite file.')
+  parser.add_argument('-i', '--input', required=True,
+                      help='Video file, image folder or glob pattern of '
+                           'images.')
+  parser.add_argument('-t', '--threshold', type=float, default=0.4,
+                      help='Score threshold for detected objects.')
+  parser.add_argument('-c', '--class_ids', type=int, nargs='*', default=[0],
+                      help='Class ids to detect, none keeps every class.')
+  parser.add_argument('--gate_size', type=int, nargs=2, default=[160, 120],
+                      help='Width and height of the grayscale copy.')
+  parser.add_argument('--block', type=int, default=8,
+                      help='Side of the compared blocks in pixels.')
+  parser.add_argument('--pixel_threshold', type=float, default=15.0,
+                      help='Mean absolute difference of a changed block.')
+  parser.add_argument('--min_changed', type=float, default=0.01,
+                      help='Fraction of changed blocks that runs the '
+                           'detector.')
+  parser.add_argument('--max_skip', type=int,
+                      help='Run the detector after this many skipped frames.')
+  parser.add_argument('--iou', type=float, default=0.5,
+                      help='IoU needed for two detections to agree.')
+  parser.add_argument('--compare', action='store_true',
+                      help='Also run the detector on every frame and report '
+                           'the accuracy cost.')
+  parser.add_argument('-d', '--draft', action='store_true',
+                      help='Decode JPEG images at reduced resolution, no '
+                           'smaller than the model input.')
+  parser.add_argument('--cpu', action='store_true',
+                      help='Run the model on the CPU without the Edge TPU.')
+  parser.add_argument('-o', '--output', default='motion_result.csv',
+                      help='File path of the per frame result csv file.')
+  args = parser.parse_args()
+
+  if args.cpu:
+    interpreter = tflite.Interpreter(model_path=args.model.split('@')[0])
+  else:
+    interpreter = make_interpreter(args.model)
+  interpreter.allocate_tensors()
+  session = detect.DetectorSession(interpreter)
+
+  frames, _ = stream.open_stream(args.input,
+                                 input_size=(session.input_size if args.draft
+                                             else None))
+  gate = motion.MotionGate(tuple(args.gate_size), args.block,
+                           args.pixel_threshold, args.min_changed,
+                           args.max_skip)
+  class_ids = args.class_ids or None
+
+  def run_detector(frame):
+    scale = session.set_input(
+        frame.size, lambda size: frame.image.resize(size, Image.ANTIALIAS))
+    start_time = time.perf_counter()
+    session.invoke()
+    invoke_times.append(time.perf_counter() - start_time)
+    return session.get_output_arrays(args.threshold, scale, class_ids)
+
+  rows = []
+  invoke_times = []
+  gate_time = 0.0
+  detections = None
+  start_time = time.perf_counter()
+  for frame in frames:
+    gate_start_time = time.perf_counter()
+    run = gate.should_run(frame.image)
+    gate_time += time.perf_counter() - gate_start_time
+    if run:
+      detections = run_detector(frame)
+    row = [frame.index, run, float(gate.mask.mean()), len(detections)]
+    if args.compare:
+      reference = detections if run else run_detector(frame)
+      row += [len(reference),
+              matching.agreement(reference, detections, args.iou)]
+    rows.append(row)
+  total_time = time.perf_counter() - start_time
+
+  with open(args.output, mode='w') as f:
+    csv_writer = csv.writer(f, delimiter=',', quotechar='"',
+                            quoting=csv.QUOTE_MINIMAL)
+    csv_writer.writerow(["Frame: ", "Detector Ran: ", "Changed Blocks: ",
+                         "Count: ", "Reference Count: ", "Agreement: "])
+    csv_writer.writerows(rows)
+
+  invokes = sum(1 for row in rows if row[1])
+  print("Frames {}, detector invokes {}, skipped {} ({:.1f} %)".format(
+      len(rows), invokes, len(rows) - invokes,
+      100.0 * (len(rows) - invokes) / max(len(rows), 1)))
+  print("Motion gate {:.2f} ms per frame, invoke {:.2f} ms".format(
+      gate_time / max(len(rows), 1) * 1000,
+      np.mean(invoke_times) * 1000 if invoke_times else 0.0))
+  if not args.compare:
+    print("Total time {:.2f} s, {:.2f} FPS".format(
+        total_time, len(rows) / total_time if total_time else 0.0))
+    return
+  skipped = [row for row in rows if not row[1]]
+  if skipped:
+    drift = np.array([row[3] - row[4] for row in skipped])
+    print("On skipped frames: agreement {:.3f}, mean absolute count drift "
+          "{:.3f}, max {}".format(np.mean([row[5] for row in skipped]),
+                                  np.abs(drift).mean(), np.abs(drift).max()))
+  print("Over all frames: agreement {:.3f}".format(
+      np.mean([row[5] for row in rows]) if rows else 1.0))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,78 @@
+# Lint as: python3
+"""Runs a TFLite model on an image folder with a pool of CPU processes.
+
+Sweeps the number of worker processes and the number of threads used by each
+worker's interpreter and reports the throughput of every combination, along
+with the average invoke and decode times per image in the workers.
+"""
+
+import argparse
+import csv
+import os
+import time
+from glob import glob
+
+import cpu_pool
+
+
+def main():
+  parser = argparse.ArgumentParser(
+      formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+  parser.add_argument('-m', '--model', required=True,
+                      help='File path of .tflite file.')
+  parser.add_argument('-i', '--input_folder', required=True,
+                      help='File path of image folder')
+  parser.add_argument('-t', '--threshold', type=float, default=0.4,
+                      help='Score threshold for detected objects.')
+  parser.add_argument('-w', '--workers', type=int, nargs='+', default=[1, 2, 4],
+                      help='Worker process counts to sweep.')
+  parser.add_argument('-n', '--num_threads', type=int, nargs='+',
+                      default=[1, 2],
+                      help='Interpreter thread counts to sweep.')
+  parser.add_argument('-d', '--draft', action='store_true',
+                      help='Decode JPEG images at reduced resolution, no '
+                           'smaller than the model input.')
+  parser.add_argument('--mean', type=float,
+                      help='Pixel value the model maps to 0, 127.5 for float '
+                           'inputs if not given.')
+  parser.add_argument('--std', type=float,
+                      help='Pixel range the model maps to 1, 127.5 for float '
+                           'inputs if not given.')
+  parser.add_argument('-o', '--output', default='pool_sweep.csv',
+                      help='File path of the sweep result csv file.')
+  args = parser.parse_args()
+
+  image_files = sorted(glob(os.path.join(os.path.expanduser(args.input_folder),
+                                         "*.jpg")))
+  print("Number of images " + str(len(image_files)))
+
+  with open(args.output, mode='w') as f:
+    csv_writer = csv.writer(f, delimiter=',', quotechar='"',
+                            quoting=csv.QUOTE_MINIMAL)
+    csv_writer.writerow(["Workers: ", "Threads: ", "Average Inference Time: ",
+                         "Average Decode Time: ", "FPS: "])
+    print("{:>8}{:>8}{:>16}{:>16}{:>10}".format(
+        "Workers", "Threads", "Invoke (ms)", "Decode (ms)", "FPS"))
+    for workers in args.workers:
+      for num_threads in args.num_threads:
+        with cpu_pool.CpuPool(args.model, workers, num_threads,
+                              args.threshold, mean=args.mean,
+                              std=args.std) as pool:
+          # Warm up every worker before timing
+          pool.run(image_files[:workers], args.draft)
+          start_time = time.perf_counter()
+          _, inference_times, decode_times = pool.run(image_files,
+                                                      args.draft)
+          total_time = time.perf_counter() - start_time
+        average_time = sum(inference_times) / max(len(inference_times), 1)
+        decode_time = sum(decode_times) / max(len(decode_times), 1)
+        fps = len(image_files) / total_time if total_time else 0.0
+        csv_writer.writerow([workers, num_threads, average_time, decode_time,
+                             fps])
+        print("{:>8}{:>8}{:>16.2f}{:>16.2f}{:>10.2f}".format(
+            workers, num_threads, average_time * 1000, decode_time * 1000,
+            fps))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,83 @@
+# Lint as: python3
+"""Runs object detection on an image folder across several interpreters.
+
+One interpreter is built for every listed Edge TPU device, or for every CPU
+worker when running without the Edge TPU, and the images are spread across
+them. Throughput is reported per device and in total.
+"""
+
+import argparse
+import csv
+import os
+from glob import glob
+
+import tflite_runtime.interpreter as tflite
+
+import sharded
+from run_object_detection import make_interpreter
+
+
+def make_interpreters(model_file, devices, cpu_workers, num_threads):
+  """Returns dictionary mapping device name to allocated interpreter."""
+  model_file = model_file.split('@')[0]
+  if cpu_workers:
+    interpreters = {'cpu:{}'.format(i): tflite.Interpreter(
+                        model_path=model_file, num_threads=num_threads)
+                    for i in range(cpu_workers)}
+  else:
+    interpreters = {device: make_interpreter(model_file + '@' + device)
+                    for device in devices}
+  for interpreter in interpreters.values():
+    interpreter.allocate_tensors()
+  return interpreters
+
+
+def main():
+  parser = argparse.ArgumentParser(
+      formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+  parser.add_argument('-m', '--model', required=True,
+                      help='File path of .tflite file.')
+  parser.add_argument('-i', '--input_folder', required=True,
+                      help='File path of image folder')
+  parser.add_argument('-t', '--threshold', type=float, default=0.4,
+                      help='Score threshold for detected objects.')
+  parser.add_argument('--devices', nargs='+', default=['usb:0'],
+                      help='Edge TPU devices, e.g. usb:0 usb:1 pci:0.')
+  parser.add_argument('--cpu', type=int, default=0,
+                      help='Number of CPU interpreters, replaces --devices.')
+  parser.add_argument('--num_threads', type=int, default=1,
+                      help='Threads used by each CPU interpreter.')
+  parser.add_argument('-d', '--draft', action='store_true',
+                      help='Decode JPEG images at reduced resolution, no '
+                           'smaller than the model input.')
+  parser.add_argument('-o', '--output', default='sharded_result.csv',
+                      help='File path of the per image result csv file.')
+  args = parser.parse_args()
+
+  interpreters = make_interpreters(args.model, args.devices, args.cpu,
+                                   args.num_threads)
+  image_files = sorted(glob(os.path.join(os.path.expanduser(args.input_folder),
+                                         "*.jpg")))
+  print("Number of images {} on {} interpreters".format(len(image_files),
+                                                        len(interpreters)))
+  results, stats, total = sharded.run_sharded(interpreters, image_files,
+                                              args.threshold, args.draft)
+
+  with open(args.output, mode='w') as f:
+    csv_writer = csv.writer(f, delimiter=',', quotechar='"',
+                            quoting=csv.QUOTE_MINIMAL)
+    csv_writer.writerow(["Image: ", "Device: ", "Inference Time: ",
+                         "Detected Objects: "])
+    for result in results:
+      csv_writer.writerow([result.image_file, result.device,
+                           result.inference_time, len(result.objs)])
+
+  print("{:<10}{:>10}{:>14}{:>10}".format("Device", "Images", "Busy (s)",
+                                          "FPS"))
+  for device_stats in stats:
+    print("{:<10}{:>10}{:>14.2f}{:>10.2f}".format(*device_stats))
+  print("{:<10}{:>10}{:>14}{:>10.2f}".format("Total", len(results), "", total))
+
+
+if __name__ == '__main__':
+  main()
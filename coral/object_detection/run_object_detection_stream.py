@@ -0,0 +1,88 @@
+# Lint as: python3
+"""Runs object detection on a local video file or image sequence.
+
+Reports processed and dropped frames, the effective detection rate and the
+latency per processed frame, and writes the number of detections per processed
+frame to a csv file. With `--realtime` frames are released at the source frame
+rate and the latest frame wins when detection falls behind, otherwise every
+frame is processed as fast as possible.
+"""
+
+import argparse
+import csv
+
+from PIL import Image
+
+import detect
+import stream
+import tflite_runtime.interpreter as tflite
+from run_object_detection import make_interpreter
+
+
+def main():
+  parser = argparse.ArgumentParser(
+      formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+  parser.add_argument('-m', '--model', required=True,
+                      help='File path of .tflite file.')
+  parser.add_argument('-i', '--input', required=True,
+                      help='Video file, image folder or glob pattern of '
+                           'images.')
+  parser.add_argument('-t', '--threshold', type=float, default=0.4,
+                      help='Score threshold for detected objects.')
+  parser.add_argument('-s', '--skip', type=int, default=0,
+                      help='Frames skipped after each read frame.')
+  parser.add_argument('-f', '--fps', type=float,
+                      help='Source frame rate, by default the video frame '
+                           'rate or 30 for image sequences.')
+  parser.add_argument('-r', '--realtime', action='store_true',
+                      help='Release frames at the source frame rate and drop '
+                           'frames when detection falls behind.')
+  parser.add_argument('-d', '--draft', action='store_true',
+                      help='Decode JPEG images at reduced resolution, no '
+                           'smaller than the model input.')
+  parser.add_argument('--cpu', action='store_true',
+                      help='Run the model on the CPU without the Edge TPU.')
+  parser.add_argument('-o', '--output', default='stream_result.csv',
+                      help='File path of the per frame result csv file.')
+  args = parser.parse_args()
+
+  if args.cpu:
+    interpreter = tflite.Interpreter(model_path=args.model.split('@')[0])
+  else:
+    interpreter = make_interpreter(args.model)
+  interpreter.allocate_tensors()
+  session = detect.DetectorSession(interpreter)
+
+  frames, fps = stream.open_stream(
+      args.input, args.fps, args.skip,
+      session.input_size if args.draft else None)
+  counts = {}
+
+  def process(frame):
+    scale = session.set_input(
+        frame.size, lambda size: frame.image.resize(size, Image.ANTIALIAS))
+    session.invoke()
+    counts[frame.index] = len(session.get_output_arrays(args.threshold, scale))
+
+  records, result = stream.run_stream(frames, process, args.realtime)
+
+  with open(args.output, mode='w') as f:
+    csv_writer = csv.writer(f, delimiter=',', quotechar='"',
+                            quoting=csv.QUOTE_MINIMAL)
+    csv_writer.writerow(["Frame: ", "Detections: ", "Latency: "])
+    for index, latency in records:
+      csv_writer.writerow([index, counts[index], latency])
+
+  latency = result['latency']
+  print("Source rate {:.2f} FPS, every {} frame(s) read".format(
+      fps, args.skip + 1))
+  print("Processed {} frames, dropped {}, in {:.2f} s".format(
+      result['processed'], result['dropped'], result['duration']))
+  print("Effective detection rate {:.2f} FPS".format(result['detection_rate']))
+  if latency['count']:
+    print("Latency p50 {:.2f} ms, p99 {:.2f} ms".format(
+        latency['p50'] * 1000, latency['p99'] * 1000))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,119 @@
+# Lint as: python3
+"""Runs tiled detection on high resolution frames for several tile grids.
+
+For every grid given with `--grids` (columns x rows) the frames of a video
+file or image sequence are run through `tiling.TiledDetector`, and the cost
+per frame is reported against the number of tiles: tiles run and skipped per
+frame, milliseconds per frame and per tile run, and detections per frame.
+Several interpreters, e.g. one per Edge TPU with `--devices usb:0 usb:1`,
+share the tiles of a frame.
+"""
+
+import argparse
+import csv
+import time
+
+import numpy as np
+
+import detect
+import stats
+import stream
+import tflite_runtime.interpreter as tflite
+import tiling
+from run_object_detection import make_interpreter
+
+
+def parse_grid(text):
+  """Returns (columns, rows) from text like '3x2'."""
+  columns, _, rows = text.lower().partition('x')
+  return int(columns), int(rows or columns)
+
+
+def main():
+  parser = argparse.ArgumentParser(
+      formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+  parser.add_argument('-m', '--model', required=True,
+                      help='File path of .tflite file.')
+  parser.add_argument('-i', '--input', required=True,
+                      help='Video file, image folder or glob pattern of '
+                           'images.')
+  parser.add_argument('-t', '--threshold', type=float, default=0.4,
+                      help='Score threshold for detected objects.')
+  parser.add_argument('-c', '--class_ids', type=int, nargs='*', default=[0],
+                      help='Class ids to detect, none keeps every class.')
+  parser.add_argument('-g', '--grids', nargs='+', default=['1x1', '2x2', '3x3'],
+                      help='Tile grids to compare as columns x rows.')
+  parser.add_argument('--overlap', type=float, default=0.2,
+                      help='Fraction of a tile shared with its neighbour.')
+  parser.add_argument('--iou', type=float, default=0.5,
+                      help='IoU above which duplicates across seams are '
+                           'suppressed.')
+  parser.add_argument('--full_frame', action='store_true',
+                      help='Also run the whole frame for large objects.')
+  parser.add_argument('--no_skip', action='store_true',
+                      help='Run every tile, also static ones without '
+                           'detections.')
+  parser.add_argument('-n', '--frames', type=int, default=100,
+                      help='Maximum number of frames per grid.')
+  parser.add_argument('--devices', nargs='*',
+                      help='Edge TPU devices, e.g. usb:0 usb:1, each gets its '
+                           'own interpreter.')
+  parser.add_argument('--cpu', action='store_true',
+                      help='Run the model on the CPU without the Edge TPU.')
+  parser.add_argument('-o', '--output', default='tiled_result.csv',
+                      help='File path of the result csv file.')
+  args = parser.parse_args()
+
+  model_file = args.model.split('@')[0]
+  if args.cpu:
+    interpreters = [tflite.Interpreter(model_path=model_file)]
+  elif args.devices:
+    interpreters = [make_interpreter(model_file + '@' + device)
+                    for device in args.devices]
+  else:
+    interpreters = [make_interpreter(args.model)]
+  sessions = []
+  for interpreter in interpreters:
+    interpreter.allocate_tensors()
+    sessions.append(detect.DetectorSession(interpreter))
+  class_ids = args.class_ids or None
+
+  print("{:>6}{:>7}{:>9}{:>10}{:>10}{:>10}{:>12}".format(
+      "Grid", "Tiles", "Run", "Frame p50", "Frame p99", "Per tile",
+      "Detections"))
+  with open(args.output, mode='w') as f:
+    csv_writer = csv.writer(f, delimiter=',', quotechar='"',
+                            quoting=csv.QUOTE_MINIMAL)
+    csv_writer.writerow(["Grid: ", "Tiles: ", "Tiles Run per Frame: ",
+                         "Average Frame Time: ", "P99 Frame Time: ",
+                         "Time per Tile Run: ", "Detections per Frame: "])
+    for text in args.grids:
+      grid = parse_grid(text)
+      detector = tiling.TiledDetector(
+          sessions, grid, args.threshold, args.overlap, args.iou, class_ids,
+          args.full_frame, skip_static=not args.no_skip)
+      frames, _ = stream.open_stream(args.input)
+      times, runs, counts = [], [], []
+      for frame in frames:
+        if len(times) >= args.frames:
+          break
+        start_time = time.perf_counter()
+        detections, tiles_run = detector.detect(frame.image)
+        times.append(time.perf_counter() - start_time)
+        runs.append(tiles_run)
+        counts.append(len(detections))
+      if not times:
+        raise SystemExit('No frames found in ' + args.input)
+      tiles = grid[0] * grid[1] + (1 if args.full_frame else 0)
+      summary = stats.summarize(times)
+      per_tile = sum(times) / max(sum(runs), 1)
+      print("{:>6}{:>7}{:>9.2f}{:>10.2f}{:>10.2f}{:>10.2f}{:>12.2f}".format(
+          text, tiles, np.mean(runs), summary['p50'] * 1000,
+          summary['p99'] * 1000, per_tile * 1000, np.mean(counts)))
+      csv_writer.writerow([text, tiles, np.mean(runs), summary['mean'],
+                           summary['p99'], per_tile, np.mean(counts)])
+  print("Times in ms, Run is the average number of tiles run per frame.")
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,126 @@
+# Lint as: python3
+"""Counts objects in a stream running the detector only on some frames.
+
+The detector runs every `--interval` frames, or earlier when the tracker
+confidence falls below `--min_confidence`, and `tracker.IouTracker` carries the
+boxes forward in between. Reports the invokes saved and, with `--compare`,
+how far the per frame counts drifted from running the detector on every
+frame. The reference detections are computed on the same pass, the tracker
+only sees the ones of the scheduled frames.
+"""
+
+import argparse
+import csv
+import time
+
+import numpy as np
+from PIL import Image
+
+import detect
+import stream
+import tflite_runtime.interpreter as tflite
+import tracker
+from run_object_detection import make_interpreter
+
+
+def main():
+  parser = argparse.ArgumentParser(
+      formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+  parser.add_argument('-m', '--model', required=True,
+                      help='File path of .tflite file.')
+  parser.add_argument('-i', '--input', required=True,
+                      help='Video file, image folder or glob pattern of '
+                           'images.')
+  parser.add_argument('-t', '--threshold', type=float, default=0.4,
+                      help='Score threshold for detected objects.')
+  parser.add_argument('-c', '--class_ids', type=int, nargs='*', default=[0],
+                      help='Class ids to count, none counts every class.')
+  parser.add_argument('-n', '--interval', type=int, default=5,
+                      help='Run the detector every n frames.')
+  parser.add_argument('--min_confidence', type=float,
+                      help='Also run the detector when a track score decays '
+                           'below this.')
+  parser.add_argument('--iou', type=float, default=0.3,
+                      help='IoU needed to match a detection to a track.')
+  parser.add_argument('--max_misses', type=int, default=1,
+                      help='Detector runs a track survives without a match.')
+  parser.add_argument('--compare', action='store_true',
+                      help='Also run the detector on every frame and report '
+                           'the count drift.')
+  parser.add_argument('-d', '--draft', action='store_true',
+                      help='Decode JPEG images at reduced resolution, no '
+                           'smaller than the model input.')
+  parser.add_argument('--cpu', action='store_true',
+                      help='Run the model on the CPU without the Edge TPU.')
+  parser.add_argument('-o', '--output', default='tracking_result.csv',
+                      help='File path of the per frame result csv file.')
+  args = parser.parse_args()
+
+  if args.cpu:
+    interpreter = tflite.Interpreter(model_path=args.model.split('@')[0])
+  else:
+    interpreter = make_interpreter(args.model)
+  interpreter.allocate_tensors()
+  session = detect.DetectorSession(interpreter)
+
+  frames, _ = stream.open_stream(args.input,
+                                 input_size=(session.input_size if args.draft
+                                             else None))
+  tracks = tracker.IouTracker(args.iou, max_misses=args.max_misses)
+  schedule = tracker.DetectionSchedule(args.interval, args.min_confidence)
+  class_ids = args.class_ids or None
+
+  def run_detector(frame):
+    scale = session.set_input(
+        frame.size, lambda size: frame.image.resize(size, Image.ANTIALIAS))
+    session.invoke()
+    return session.get_output_arrays(args.threshold, scale, class_ids)
+
+  rows = []
+  invokes = 0
+  tracking_time = 0.0
+  start_time = time.perf_counter()
+  for frame in frames:
+    reference = run_detector(frame) if args.compare else None
+    due = schedule.due(tracks)
+    if due:
+      detections = reference if reference is not None else run_detector(frame)
+      invokes += 1
+    step_start_time = time.perf_counter()
+    if due:
+      tracks.update(detections)
+    else:
+      tracks.predict()
+    tracking_time += time.perf_counter() - step_start_time
+    schedule.step(due)
+    rows.append((frame.index, due, tracks.count(),
+                 len(reference) if reference is not None else None,
+                 ' '.join(str(t.id) for t in tracks.tracks if t.misses == 0)))
+  total_time = time.perf_counter() - start_time
+
+  with open(args.output, mode='w') as f:
+    csv_writer = csv.writer(f, delimiter=',', quotechar='"',
+                            quoting=csv.QUOTE_MINIMAL)
+    csv_writer.writerow(["Frame: ", "Detector Ran: ", "Count: ",
+                         "Reference Count: ", "Track Ids: "])
+    csv_writer.writerows(rows)
+
+  print("Frames {}, detector invokes {}, saved {} ({:.1f} %)".format(
+      len(rows), invokes, len(rows) - invokes,
+      100.0 * (len(rows) - invokes) / max(len(rows), 1)))
+  print("Tracks created {}, tracking took {:.2f} ms per frame".format(
+      tracks.next_id, tracking_time / max(len(rows), 1) * 1000))
+  if not args.compare:
+    print("Total time {:.2f} s, {:.2f} FPS".format(
+        total_time, len(rows) / total_time if total_time else 0.0))
+    return
+  drift = np.array([count - reference for _, _, count, reference, _ in rows])
+  if len(drift):
+    print("Count drift against the detector on every frame: mean absolute "
+          "{:.3f}, max {}, exact on {:.1f} % of frames".format(
+              np.abs(drift).mean(), np.abs(drift).max(),
+              100.0 * np.mean(drift == 0)))
+
+
+if __name__ == '__main__':
+  main()
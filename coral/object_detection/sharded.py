@@ -0,0 +1,88 @@
+# Lint as: python3
+"""Runs a set of images across several interpreters.
+
+Each interpreter, for example one per Edge TPU device or one per CPU worker,
+gets its own thread pulling images from a shared work queue. The interpreter
+releases the GIL while invoking, so the devices or CPU cores run in parallel.
+Results are returned in the order of the input images.
+"""
+
+import collections
+import queue
+import threading
+import time
+
+from PIL import Image
+
+import detect
+import preprocess
+
+Result = collections.namedtuple('Result',
+                                ['image_file', 'device', 'objs',
+                                 'inference_time'])
+
+DeviceStats = collections.namedtuple('DeviceStats',
+                                     ['device', 'images', 'busy_time',
+                                      'throughput'])
+
+
+def run_sharded(interpreters, image_files, threshold, draft=False):
+  """Runs detection on every image using all interpreters.
+
+  Args:
+    interpreters: dictionary mapping device name to allocated interpreter.
+    image_files: list of image paths.
+    threshold: score threshold for detected objects.
+    draft: decode JPEG images in draft mode.
+  Returns:
+    Tuple of (list of `Result` in the order of `image_files`, list of
+    `DeviceStats`, total throughput in images per second).
+  """
+  work = queue.Queue()
+  for index, image_file in enumerate(image_files):
+    work.put((index, image_file))
+  results = [None] * len(image_files)
+  counts = {device: 0 for device in interpreters}
+  busy = {device: 0.0 for device in interpreters}
+  errors = []
+
+  def worker(device, interpreter):
+    input_size = detect.input_size(interpreter) if draft else None
+    while not errors:
+      try:
+        index, image_file = work.get_nowait()
+      except queue.Empty:
+        return
+      try:
+        start_time = time.perf_counter()
+        size, image = preprocess.load_image(image_file, input_size)
+        scale = detect.set_input(interpreter, size,
+                                 lambda size: image.resize(size,
+                                                           Image.ANTIALIAS))
+        invoke_start_time = time.perf_counter()
+        interpreter.invoke()
+        inference_time = time.perf_counter() - invoke_start_time
+        objs = detect.get_output(interpreter, threshold, scale)
+        busy[device] += time.perf_counter() - start_time
+      except Exception as e:  # Reported on the calling thread
+        errors.append(e)
+        return
+      results[index] = Result(image_file, device, objs, inference_time)
+      counts[device] += 1
+
+  threads = [threading.Thread(target=worker, args=item)
+             for item in interpreters.items()]
+  start_time = time.perf_counter()
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  total_time = time.perf_counter() - start_time
+  if errors:
+    raise errors[0]
+
+  stats = [DeviceStats(device, counts[device], busy[device],
+                       counts[device] / total_time if total_time else 0.0)
+           for device in interpreters]
+  total = len(image_files) / total_time if total_time else 0.0
+  return results, stats, total
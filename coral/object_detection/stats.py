@@ -0,0 +1,52 @@
+# Lint as: python3
+"""Summary statistics for latency samples."""
+
+import numpy as np
+
+PERCENTILES = (50, 90, 99)
+
+
+def summarize(samples):
+  """Returns dictionary of summary statistics of a list of samples.
+
+  Keys are count, mean, std, min, max and p50, p90, p99. All values except the
+  count are in the unit of the samples.
+  """
+  samples = np.asarray(samples, dtype=np.float64)
+  if samples.size == 0:
+    return {'count': 0}
+  summary = {
+      'count': int(samples.size),
+      'mean': float(samples.mean()),
+      'std': float(samples.std()),
+      'min': float(samples.min()),
+      'max': float(samples.max()),
+  }
+  for percentile, value in zip(PERCENTILES,
+                               np.percentile(samples, PERCENTILES)):
+    summary['p{}'.format(percentile)] = float(value)
+  return summary
+
+
+def histogram(samples, bins=20):
+  """Returns histogram of samples as dictionary with bin edges and counts."""
+  samples = np.asarray(samples, dtype=np.float64)
+  if samples.size == 0:
+    return {'edges': [], 'counts': []}
+  counts, edges = np.histogram(samples, bins=bins)
+  return {'edges': edges.tolist(), 'counts': counts.tolist()}
+
+
+def format_table(summaries, scale=1000.0):
+  """Returns text table of named summaries, values multiplied by `scale`.
+
+  The default scale prints samples recorded in seconds as milliseconds.
+  """
+  columns = ('mean', 'std', 'p50', 'p90', 'p99', 'max')
+  lines = ['{:<12}{:>8}'.format('Stage', 'Count') +
+           ''.join('{:>10}'.format(column) for column in columns)]
+  for name, summary in summaries.items():
+    lines.append('{:<12}{:>8}'.format(name, summary['count']) +
+                 ''.join('{:>10.3f}'.format(summary.get(column, 0.0) * scale)
+                         for column in columns))
+  return '\n'.join(lines)
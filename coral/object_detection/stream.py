@@ -0,0 +1,212 @@
+# Lint as: python3
+"""Frame streams from local video files and image sequences.
+
+`open_stream` returns a generator of `StreamFrame` over a video file (read with
+OpenCV) or an image sequence (a directory or a glob pattern, read with PIL in
+file name order). Frame skipping happens in the reader, so skipped frames are
+not decoded: video frames are only grabbed and skipped image files are never
+opened.
+
+`run_stream` feeds the frames to a processing function. Offline every frame
+is processed in turn. In realtime mode frames are released at their timestamps
+on a reader thread, like from a camera, and the latest frame wins: a frame
+still waiting when a newer one is released is dropped, so the detector always
+works on the freshest frame when it falls behind.
+"""
+
+import collections
+import os
+import threading
+import time
+from glob import glob
+
+from PIL import Image
+
+import preprocess
+import stats
+
+try:
+  import cv2
+except ImportError:
+  cv2 = None
+
+StreamFrame = collections.namedtuple('StreamFrame', ['index', 'timestamp',
+                                                     'size', 'image'])
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+def image_sequence(path, fps=30.0, skip=0, input_size=None):
+  """Yields frames of an image sequence.
+
+  Args:
+    path: directory of images or glob pattern.
+    fps: frame rate the timestamps are computed from.
+    skip: number of frames skipped after each yielded frame.
+    input_size: model input size, decodes JPEG images in draft mode.
+  """
+  if os.path.isdir(path):
+    image_files = sorted(
+        os.path.join(path, name) for name in os.listdir(path)
+        if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS)
+  else:
+    image_files = sorted(glob(os.path.expanduser(path)))
+  for index in range(0, len(image_files), skip + 1):
+    size, image = preprocess.load_image(image_files[index], input_size)
+    yield StreamFrame(index, index / fps, size, image)
+
+
+def video_fps(path):
+  """Returns frame rate stored in a video file, or None."""
+  if cv2 is None:
+    return None
+  capture = cv2.VideoCapture(path)
+  fps = capture.get(cv2.CAP_PROP_FPS) if capture.isOpened() else 0.0
+  capture.release()
+  return fps or None
+
+
+def video_frames(path, fps=None, skip=0):
+  """Yields frames of a video file as RGB images.
+
+  Args:
+    path: video file readable by OpenCV.
+    fps: frame rate the timestamps are computed from, by default the rate
+      stored in the file.
+    skip: number of frames skipped after each yielded frame.
+  """
+  if cv2 is None:
+    raise RuntimeError('Reading video files needs OpenCV (cv2)')
+  capture = cv2.VideoCapture(path)
+  if not capture.isOpened():
+    raise OSError('Cannot open video file ' + path)
+  fps = fps or capture.get(cv2.CAP_PROP_FPS) or 30.0
+  try:
+    index = 0
+    while True:
+      ok, frame = capture.read()
+      if not ok:
+        return
+      image = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+      yield StreamFrame(index, index / fps, image.size, image)
+      index += 1
+      for _ in range(skip):
+        # Grab without decoding
+        if not capture.grab():
+          return
+        index += 1
+  finally:
+    capture.release()
+
+
+def open_stream(path, fps=None, skip=0, input_size=None):
+  """Returns (frame generator, frame rate) of a video file or image sequence.
+
+  Args:
+    path: video file, directory of images or glob pattern of images.
+    fps: frame rate of the source, by default the rate stored in a video file
+      or 30 for image sequences.
+    skip: number of frames skipped after each yielded frame.
+    input_size: model input size, decodes JPEG images in draft mode.
+  """
+  if os.path.isdir(path) or any(c in path for c in '*?['):
+    fps = fps or 30.0
+    return image_sequence(path, fps, skip, input_size), fps
+  if os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS:
+    raise ValueError('Give a directory or glob pattern for image sequences')
+  fps = fps or video_fps(path) or 30.0
+  return video_frames(path, fps, skip), fps
+
+
+class LatestFrame:
+  """Holds the newest released frame, a newer one replaces it."""
+
+  def __init__(self):
+    self._condition = threading.Condition()
+    self._frame = None
+    self._closed = False
+    self.dropped = 0
+
+  def put(self, frame):
+    with self._condition:
+      if self._frame is not None:
+        self.dropped += 1
+      self._frame = frame
+      self._condition.notify()
+
+  def get(self):
+    """Returns the newest frame, or None once closed and empty."""
+    with self._condition:
+      while self._frame is None and not self._closed:
+        self._condition.wait()
+      frame, self._frame = self._frame, None
+      return frame
+
+  def close(self):
+    with self._condition:
+      self._closed = True
+      self._condition.notify()
+
+
+def run_stream(frames, process, realtime=False, clock=time.perf_counter):
+  """Runs `process(frame)` on a stream of frames.
+
+  Args:
+    frames: iterable of `StreamFrame`.
+    process: function processing one frame.
+    realtime: release frames at their timestamps and drop frames which are
+      replaced by a newer one before they are processed.
+    clock: monotonic clock.
+  Returns:
+    Tuple of (list of (frame index, latency) per processed frame, dictionary
+    with processed and dropped counts, duration and effective detection rate).
+    The latency is counted from the release of the frame, or from the start of
+    its decoding offline.
+  """
+  records = []
+  origin = clock()
+  if not realtime:
+    released = origin
+    for frame in frames:
+      process(frame)
+      now = clock()
+      records.append((frame.index, now - released))
+      released = now
+    dropped = 0
+  else:
+    latest = LatestFrame()
+    errors = []
+
+    def play():
+      try:
+        for frame in frames:
+          delay = origin + frame.timestamp - clock()
+          if delay > 0:
+            time.sleep(delay)
+          latest.put((frame, origin + frame.timestamp))
+      except Exception as e:  # Reported on the calling thread
+        errors.append(e)
+      finally:
+        latest.close()
+
+    reader = threading.Thread(target=play, daemon=True)
+    reader.start()
+    while True:
+      item = latest.get()
+      if item is None:
+        break
+      frame, released = item
+      process(frame)
+      records.append((frame.index, clock() - max(released, origin)))
+    reader.join()
+    if errors:
+      raise errors[0]
+    dropped = latest.dropped
+  duration = clock() - origin
+  return records, {
+      'processed': len(records),
+      'dropped': dropped,
+      'duration': duration,
+      'detection_rate': len(records) / duration if duration > 0 else 0.0,
+      'latency': stats.summarize([latency for _, latency in records]),
+  }
@@ -0,0 +1,186 @@
+# Lint as: python3
+"""Tiled inference on high resolution frames.
+
+Letterboxing a 1080p frame into a 300x300 input shrinks distant people to a
+few pixels. Here the frame is cut into a grid of overlapping tiles, each tile
+is letterboxed into the input on its own, and the tile-local boxes are
+translated back into frame coordinates. Objects on a seam are found in both
+tiles, so the merged detections go through class-aware non-maximum
+suppression.
+
+Tiles are spread over the given interpreters, each interpreter runs its share
+back to back on its own thread. A tile which had no detections the last time it
+ran and shows no motion since that frame is skipped. Like in
+`motion.MotionGate`, a tile is compared with the frame it last ran on rather
+than with the previous frame, so slow motion adds up until the tile runs.
+"""
+
+import threading
+
+import numpy as np
+from PIL import Image
+
+import detect
+import motion
+
+
+def tile_grid(size, grid, overlap=0.2):
+  """Returns list of (xmin, ymin, xmax, ymax) tiles covering an image.
+
+  Args:
+    size: image (width, height).
+    grid: number of tiles as (columns, rows).
+    overlap: fraction of a tile shared with its neighbour.
+  """
+  tiles = []
+  (width, height), (columns, rows) = size, grid
+  tile_w = width / (columns - (columns - 1) * overlap)
+  tile_h = height / (rows - (rows - 1) * overlap)
+  for row in range(rows):
+    for column in range(columns):
+      x = column * tile_w * (1 - overlap)
+      y = row * tile_h * (1 - overlap)
+      tiles.append((int(round(x)), int(round(y)),
+                    int(round(min(width, x + tile_w))),
+                    int(round(min(height, y + tile_h)))))
+  return tiles
+
+
+def merge(parts, iou_threshold=0.5):
+  """Returns `detect.Detections` of all parts after class-aware NMS."""
+  boxes = np.concatenate([part.boxes for part in parts]).reshape(-1, 4)
+  scores = np.concatenate([part.scores for part in parts])
+  class_ids = np.concatenate([part.class_ids for part in parts])
+  keep = detect.non_max_suppression(boxes, scores, class_ids, iou_threshold)
+  return detect.Detections(boxes=boxes[keep], scores=scores[keep],
+                           class_ids=class_ids[keep])
+
+
+class TiledDetector:
+  """Runs a detection model on overlapping tiles of a frame.
+
+  Args:
+    sessions: list of `detect.DetectorSession`, one thread each.
+    grid: number of tiles as (columns, rows).
+    threshold: score threshold for detected objects.
+    overlap: fraction of a tile shared with its neighbour.
+    iou_threshold: IoU above which duplicates are suppressed.
+    class_ids: class ids to keep, None keeps every class.
+    full_frame: also run the whole frame, for objects larger than a tile.
+    skip_static: skip tiles without detections and motion.
+    motion_size: (width, height) of the grayscale copy compared with the
+      frame a tile last ran on, see `motion.changed_blocks`.
+    block: side of the compared blocks in pixels of the grayscale copy.
+    pixel_threshold: mean absolute pixel difference of a changed block.
+  """
+
+  def __init__(self, sessions, grid, threshold, overlap=0.2,
+               iou_threshold=0.5, class_ids=None, full_frame=False,
+               skip_static=True, motion_size=(160, 120), block=8,
+               pixel_threshold=15):
+    self.sessions = sessions
+    self.grid = grid
+    self.threshold = threshold
+    self.overlap = overlap
+    self.iou_threshold = iou_threshold
+    self.class_ids = class_ids
+    self.full_frame = full_frame
+    self.skip_static = skip_static
+    self.motion_size = motion_size
+    self.block = block
+    self.pixel_threshold = pixel_threshold
+    self._tiles = None
+    self._active = None
+    # Grayscale frame each tile last ran on, tiles run together share one
+    self._references = None
+
+  def _run_tile(self, session, image, tile):
+    xmin, ymin = tile[:2]
+    crop = image.crop(tile)
+    scale = session.set_input(
+        crop.size, lambda size: crop.resize(size, Image.ANTIALIAS))
+    session.invoke()
+    detections = session.get_output_arrays(self.threshold, scale,
+                                           self.class_ids)
+    return detect.Detections(
+        boxes=detect.BoxArray(detections.boxes).translate(xmin, ymin).array,
+        scores=detections.scores, class_ids=detections.class_ids)
+
+  def _should_run(self, current, size, tiles):
+    """Returns per tile whether it has to run on the grayscale frame."""
+    run = []
+    masks = {}
+    for tile, active, reference in zip(tiles, self._active,
+                                       self._references):
+      if active or reference is None:
+        run.append(True)
+        continue
+      # One comparison per reference frame, not per tile
+      key = id(reference)
+      if key not in masks:
+        masks[key] = motion.changed_blocks(current, reference, self.block,
+                                           self.pixel_threshold)
+      run.append(self._has_motion(masks[key], tile, size))
+    return run
+
+  @staticmethod
+  def _has_motion(mask, tile, size):
+    """Returns whether any block overlapping the tile changed."""
+    rows, columns = mask.shape
+    sx, sy = columns / size[0], rows / size[1]
+    xmin, ymin, xmax, ymax = tile
+    top, left = int(ymin * sy), int(xmin * sx)
+    bottom = max(top + 1, int(np.ceil(ymax * sy)))
+    right = max(left + 1, int(np.ceil(xmax * sx)))
+    return bool(mask[top:bottom, left:right].any())
+
+  def detect(self, image):
+    """Returns (`detect.Detections` in frame pixels, number of tiles run)."""
+    size = image.size
+    tiles = tile_grid(size, self.grid, self.overlap)
+    if tiles != self._tiles:
+      self._tiles = tiles
+      self._active = [True] * len(tiles)
+      self._references = [None] * len(tiles)
+    if self.skip_static:
+      current = motion.gray(image, self.motion_size)
+      run = self._should_run(current, size, tiles)
+    else:
+      current = None
+      run = [True] * len(tiles)
+    work = [(index, tile) for index, tile in enumerate(tiles) if run[index]]
+    if self.full_frame:
+      work.append((None, (0, 0) + size))
+
+    results = {}
+    errors = []
+
+    def worker(session, share):
+      try:
+        for index, tile in share:
+          results[index] = self._run_tile(session, image, tile)
+      except Exception as e:  # Reported on the calling thread
+        errors.append(e)
+
+    shares = [work[i::len(self.sessions)] for i in range(len(self.sessions))]
+    if len(self.sessions) == 1:
+      worker(self.sessions[0], work)
+    else:
+      threads = [threading.Thread(target=worker, args=item)
+                 for item in zip(self.sessions, shares) if item[1]]
+      for thread in threads:
+        thread.start()
+      for thread in threads:
+        thread.join()
+    if errors:
+      raise errors[0]
+
+    for index in range(len(tiles)):
+      if run[index]:
+        self._active[index] = len(results[index]) > 0
+        self._references[index] = current
+    parts = list(results.values()) or [detect.Detections(
+        boxes=np.zeros((0, 4), dtype=np.float32),
+        scores=np.zeros((0,), dtype=np.float32),
+        class_ids=np.zeros((0,), dtype=np.int32))]
+    return merge(parts, self.iou_threshold), len(work)
@@ -0,0 +1,188 @@
+# Lint as: python3
+"""IoU/centroid tracker carrying detections between detector runs.
+
+The tracker keeps one `Track` per object with a persistent id. On frames where
+the detector ran, `update` matches the detections to the tracks: first
+greedily by IoU of boxes of the same class, then the remaining ones by the
+distance between box centers relative to the track size and to the frames since
+the track was last matched, which catches objects that moved too far for their
+boxes to overlap. Unmatched detections start new
+tracks and tracks unmatched for more than `max_misses` detector runs are
+removed. On frames in between, `predict` moves every box by its velocity and
+decays its score, so the tracker confidence falls the longer the detector has
+not run.
+
+`DetectionSchedule` decides when the detector runs: every `interval` frames,
+or earlier when the tracker confidence drops below `min_confidence`.
+"""
+
+import numpy as np
+
+import detect
+
+
+class Track:
+  """Object followed across frames."""
+  __slots__ = ('id', 'bbox', 'class_id', 'score', 'velocity', 'age',
+               'misses', '_center')
+
+  def __init__(self, track_id, bbox, class_id, score):
+    self.id = track_id
+    self.bbox = bbox
+    self.class_id = class_id
+    self.score = score
+    self.velocity = (0.0, 0.0)
+    self.age = 0  # frames since the last matched detection
+    self.misses = 0  # detector runs without a match
+    self._center = _center(bbox)
+
+
+def _center(bbox):
+  return ((bbox.xmin + bbox.xmax) / 2, (bbox.ymin + bbox.ymax) / 2)
+
+
+class IouTracker:
+  """Tracks detections across frames.
+
+  Args:
+    iou_threshold: minimum IoU of a track and a detection to match.
+    max_distance: maximum center distance per frame since the track was last
+      matched, relative to the track diagonal, of a track and a detection
+      matched when their boxes do not overlap enough.
+    max_misses: detector runs a track survives without a match.
+    decay: factor applied to track scores on every predicted frame.
+  """
+
+  def __init__(self, iou_threshold=0.3, max_distance=0.5, max_misses=1,
+               decay=0.9):
+    self.iou_threshold = iou_threshold
+    self.max_distance = max_distance
+    self.max_misses = max_misses
+    self.decay = decay
+    self.tracks = []
+    self.next_id = 0
+
+  def predict(self):
+    """Moves the tracks one frame ahead, returns the tracks."""
+    for track in self.tracks:
+      track.bbox = track.bbox.translate(*track.velocity)
+      track.score *= self.decay
+      track.age += 1
+    return self.tracks
+
+  def update(self, detections):
+    """Moves the tracks one frame ahead and matches them to detections.
+
+    Args:
+      detections: `detect.Detections` of the current frame.
+    Returns:
+      List of tracks.
+    """
+    self.predict()
+    boxes = detect.BoxArray(detections.boxes)
+    matches = self._match(boxes, detections.class_ids)
+    matched = set()
+    for track_index, detection_index in matches:
+      track = self.tracks[track_index]
+      bbox = boxes[detection_index]
+      center = _center(bbox)
+      # Velocity per frame since the detection the track was last matched to
+      track.velocity = ((center[0] - track._center[0]) / track.age,
+                        (center[1] - track._center[1]) / track.age)
+      track.bbox = bbox
+      track.score = float(detections.scores[detection_index])
+      track.age = 0
+      track.misses = 0
+      track._center = center
+      matched.add(track_index)
+    tracks = []
+    for index, track in enumerate(self.tracks):
+      if index not in matched:
+        track.misses += 1
+        if track.misses > self.max_misses:
+          continue
+      tracks.append(track)
+    new = set(range(len(boxes))) - {d for _, d in matches}
+    for detection_index in sorted(new):
+      tracks.append(Track(self.next_id, boxes[detection_index],
+                          int(detections.class_ids[detection_index]),
+                          float(detections.scores[detection_index])))
+      self.next_id += 1
+    self.tracks = tracks
+    return self.tracks
+
+  def _match(self, boxes, class_ids):
+    """Returns list of (track index, detection index) pairs."""
+    if not self.tracks or not len(boxes):
+      return []
+    track_boxes = detect.BoxArray.from_bboxes(t.bbox for t in self.tracks)
+    same_class = (np.array([t.class_id for t in self.tracks])[:, None] ==
+                  np.asarray(class_ids)[None, :])
+    iou = np.where(same_class, detect.BoxArray.iou(track_boxes, boxes), 0.0)
+    matches = []
+    while True:
+      row, column = np.unravel_index(np.argmax(iou), iou.shape)
+      if iou[row, column] < self.iou_threshold:
+        break
+      matches.append((int(row), int(column)))
+      iou[row, :] = 0.0
+      iou[:, column] = 0.0
+
+    # Center distance for the rest, relative to the track diagonal. Objects
+    # are assumed to move at most `max_distance` diagonals per frame, so the
+    # gate widens with the frames since the track was last matched: with the
+    # detector running every few frames, and no velocity yet on a new track,
+    # the whole displacement since the last detection falls into one update.
+    track_centers = (track_boxes.array[:, :2] + track_boxes.array[:, 2:]) / 2
+    centers = (boxes.array[:, :2] + boxes.array[:, 2:]) / 2
+    diagonal = np.hypot(track_boxes.width, track_boxes.height)
+    frames = np.array([max(t.age, 1) for t in self.tracks])
+    distance = (np.linalg.norm(track_centers[:, None] - centers[None, :],
+                               axis=2) /
+                (np.maximum(diagonal, 1e-6) * frames)[:, None])
+    distance[~same_class] = np.inf
+    for row, column in matches:
+      distance[row, :] = np.inf
+      distance[:, column] = np.inf
+    while True:
+      row, column = np.unravel_index(np.argmin(distance), distance.shape)
+      if distance[row, column] > self.max_distance:
+        break
+      matches.append((int(row), int(column)))
+      distance[row, :] = np.inf
+      distance[:, column] = np.inf
+    return matches
+
+  def confidence(self):
+    """Returns lowest score of the current tracks, 1.0 without tracks."""
+    return min((t.score for t in self.tracks if t.misses == 0), default=1.0)
+
+  def count(self):
+    """Returns number of tracks matched on the last detector run."""
+    return sum(1 for t in self.tracks if t.misses == 0)
+
+
+class DetectionSchedule:
+  """Decides on which frames the detector runs.
+
+  Args:
+    interval: run the detector every `interval` frames.
+    min_confidence: also run it when the tracker confidence falls below this,
+      None disables the adaptive runs.
+  """
+
+  def __init__(self, interval=1, min_confidence=None):
+    self.interval = interval
+    self.min_confidence = min_confidence
+    self._since = None
+
+  def due(self, tracker):
+    """Returns whether the detector runs on the next frame."""
+    if self._since is None or self._since + 1 >= self.interval:
+      return True
+    return (self.min_confidence is not None and
+            tracker.confidence() * tracker.decay < self.min_confidence)
+
+  def step(self, detected):
+    """Records whether the detector ran on the current frame."""
+    self._since = 0 if detected else self._since + 1
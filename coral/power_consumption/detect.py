@@ -99,6 +99,131 @@ class BBox(collections.namedtuple('BBox', ['xmin', 'ymin', 'xmax', 'ymax'])):
     return area / (a.area + b.area - area)
 
 
+
+class BoxArray:
+  """Array of bounding boxes.
+
+  Stores N boxes as a contiguous float array of shape (N, 4) with rows
+  (xmin, ymin, xmax, ymax), the same field order as `BBox`. Operations are
+  applied to all boxes at once instead of one namedtuple at a time.
+  """
+  __slots__ = ('array',)
+
+  def __init__(self, array):
+    self.array = np.ascontiguousarray(array, dtype=np.float32).reshape(-1, 4)
+
+  @staticmethod
+  def from_bboxes(bboxes):
+    """Returns box array built from an iterable of `BBox`."""
+    return BoxArray(np.array(list(bboxes), dtype=np.float32))
+
+  def to_bboxes(self):
+    """Returns list of `BBox`, one per row."""
+    return [BBox(*row) for row in self.array.tolist()]
+
+  def __len__(self):
+    return len(self.array)
+
+  def __getitem__(self, index):
+    """Returns `BBox` for an integer index, `BoxArray` otherwise."""
+    if isinstance(index, (int, np.integer)):
+      return BBox(*self.array[index].tolist())
+    return BoxArray(self.array[index])
+
+  @property
+  def width(self):
+    """Returns array of bounding box widths."""
+    return self.array[:, 2] - self.array[:, 0]
+
+  @property
+  def height(self):
+    """Returns array of bounding box heights."""
+    return self.array[:, 3] - self.array[:, 1]
+
+  @property
+  def area(self):
+    """Returns array of bounding box areas."""
+    return self.width * self.height
+
+  @property
+  def valid(self):
+    """Returns boolean array telling which bounding boxes are valid."""
+    return (self.width >= 0) & (self.height >= 0)
+
+  def scale(self, sx, sy):
+    """Returns scaled bounding boxes."""
+    return BoxArray(self.array * np.array([sx, sy, sx, sy], dtype=np.float32))
+
+  def translate(self, dx, dy):
+    """Returns translated bounding boxes."""
+    return BoxArray(self.array + np.array([dx, dy, dx, dy], dtype=np.float32))
+
+  def clip(self, width, height):
+    """Returns bounding boxes clipped to a width x height image."""
+    return BoxArray(np.clip(self.array, 0,
+                            np.array([width, height, width, height],
+                                     dtype=np.float32)))
+
+  @staticmethod
+  def iou(a, b):
+    """Returns N x M matrix of intersection-over-union values.
+
+    Args:
+      a: `BoxArray` with N boxes.
+      b: `BoxArray` with M boxes.
+    """
+    a, b = a.array, b.array
+    xmin = np.maximum(a[:, None, 0], b[None, :, 0])
+    ymin = np.maximum(a[:, None, 1], b[None, :, 1])
+    xmax = np.minimum(a[:, None, 2], b[None, :, 2])
+    ymax = np.minimum(a[:, None, 3], b[None, :, 3])
+    # Invalid intersections have a negative side and contribute no area
+    intersection = np.clip(xmax - xmin, 0, None) * np.clip(ymax - ymin, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - intersection
+    with np.errstate(divide='ignore', invalid='ignore'):
+      return np.where(union > 0, intersection / union, 0.0)
+
+
+def non_max_suppression(boxes, scores, class_ids=None, iou_threshold=0.5,
+                        top_k=None):
+  """Returns indices of the boxes kept by greedy non-maximum suppression.
+
+  Boxes are visited by decreasing score and a box is dropped when it overlaps a
+  kept box of the same class by more than `iou_threshold`. The IoU matrix is
+  computed once for all boxes.
+
+  Args:
+    boxes: `BoxArray` or array of shape (N, 4).
+    scores: array of N scores.
+    class_ids: array of N class ids, None suppresses across classes.
+    iou_threshold: IoU above which the lower scored box is dropped.
+    top_k: maximum number of kept boxes.
+  Returns:
+    Array of kept indices ordered by decreasing score.
+  """
+  if not isinstance(boxes, BoxArray):
+    boxes = BoxArray(boxes)
+  order = np.argsort(-np.asarray(scores), kind='stable')
+  if not len(order):
+    return order
+  overlap = BoxArray.iou(boxes, boxes) > iou_threshold
+  if class_ids is not None:
+    class_ids = np.asarray(class_ids)
+    overlap &= class_ids[:, None] == class_ids[None, :]
+  suppressed = np.zeros(len(order), dtype=bool)
+  keep = []
+  for index in order:
+    if suppressed[index]:
+      continue
+    keep.append(index)
+    if top_k is not None and len(keep) == top_k:
+      break
+    suppressed |= overlap[index]
+  return np.array(keep, dtype=np.int64)
+
+
 def input_size(interpreter):
   """Returns input image size as (width, height) tuple."""
   _, height, width, _ = interpreter.get_input_details()[0]['shape']
@@ -161,3 +286,396 @@ def get_output(interpreter, score_threshold, image_scale=(1.0, 1.0)):
                   ymax=ymax).scale(sx, sy).map(int))
 
   return [make(i) for i in range(count) if scores[i] >= score_threshold]
+
+
+class Detections:
+  """Detected objects stored as arrays instead of a list of `Object`.
+
+  Attributes:
+    boxes: float array of shape (N, 4), rows are (xmin, ymin, xmax, ymax) in
+      the same pixel coordinates `get_output` uses.
+    scores: float array of shape (N,).
+    class_ids: int array of shape (N,).
+  """
+  __slots__ = ('boxes', 'scores', 'class_ids', '_objects')
+
+  def __init__(self, boxes, scores, class_ids):
+    self.boxes = boxes
+    self.scores = scores
+    self.class_ids = class_ids
+    self._objects = None
+
+  def __len__(self):
+    return len(self.scores)
+
+  def objects(self):
+    """Returns the detections as a list of `Object`, like `get_output`.
+
+    The list is only built the first time it is requested.
+    """
+    if self._objects is None:
+      self._objects = [
+          Object(id=class_id, score=score, bbox=BBox(*box))
+          for class_id, score, box in zip(self.class_ids.tolist(),
+                                          self.scores.tolist(),
+                                          self.boxes.astype(int).tolist())
+      ]
+    return self._objects
+
+
+def get_output_arrays(interpreter, score_threshold, image_scale=(1.0, 1.0),
+                      class_ids=None, top_k=None):
+  """Returns detected objects as `Detections` arrays.
+
+  Args:
+    interpreter: Interpreter object.
+    score_threshold: minimum score of the returned detections.
+    image_scale: resize ratio returned by `set_input`.
+    class_ids: optional sequence of class ids to keep, all classes are kept
+      when None.
+    top_k: optional maximum number of detections to keep, the highest scoring
+      ones are kept.
+  Returns:
+    `Detections` holding copies of the filtered output tensors.
+  """
+  return _select_detections(output_tensor(interpreter, 0),
+                            output_tensor(interpreter, 1),
+                            output_tensor(interpreter, 2),
+                            int(output_tensor(interpreter, 3)),
+                            input_size(interpreter), score_threshold,
+                            image_scale, class_ids, top_k)
+
+
+def _select_detections(boxes, classes, scores, count, size, score_threshold,
+                       image_scale, class_ids, top_k):
+  """Filters raw SSD output tensors into `Detections`."""
+  boxes = boxes.reshape(-1, 4)[:count]
+  classes = classes.reshape(-1)[:count]
+  scores = scores.reshape(-1)[:count]
+
+  keep = scores >= score_threshold
+  if class_ids is not None:
+    keep &= np.isin(classes, class_ids)
+  indices = np.flatnonzero(keep)
+  if top_k is not None and len(indices) > top_k:
+    order = np.argsort(-scores[indices], kind='stable')[:top_k]
+    indices = indices[order]
+
+  width, height = size
+  image_scale_x, image_scale_y = image_scale
+  sx, sy = width / image_scale_x, height / image_scale_y
+
+  # Output boxes are (ymin, xmin, ymax, xmax), reorder to BBox field order
+  selected = boxes[indices][:, [1, 0, 3, 2]] * np.array([sx, sy, sx, sy])
+  return Detections(boxes=selected,
+                    scores=scores[indices].astype(np.float32),
+                    class_ids=classes[indices].astype(np.int32))
+
+
+# Darknet anchors in input pixels, one group per output head ordered from the
+# finest grid (stride 8, or 16 for tiny) to the coarsest (stride 32). The
+# groups follow the masks of the stock cfg files: 0,1,2 / 3,4,5 / 6,7,8 for
+# yolov3.cfg and 1,2,3 / 3,4,5 for yolov3-tiny.cfg, where the fine head reuses
+# anchor 3 and anchor 0 (10, 14) is unused.
+YOLOV3_ANCHORS = (((10, 13), (16, 30), (33, 23)),
+                  ((30, 61), (62, 45), (59, 119)),
+                  ((116, 90), (156, 198), (373, 326)))
+YOLOV3_TINY_ANCHORS = (((23, 27), (37, 58), (81, 82)),
+                       ((81, 82), (135, 169), (344, 319)))
+
+_MAX_NMS_CANDIDATES = 1000
+
+
+def dequantize(array, quantization):
+  """Returns float32 values of a tensor given its (scale, zero_point)."""
+  scale, zero_point = quantization
+  if not scale:
+    return array.astype(np.float32)
+  return (array.astype(np.float32) - zero_point) * np.float32(scale)
+
+
+def _sigmoid(x):
+  return 1.0 / (1.0 + np.exp(-x))
+
+
+def decode_yolo(heads, size, score_threshold, image_scale=(1.0, 1.0),
+                anchors=None, iou_threshold=0.45, class_ids=None, top_k=100):
+  """Decodes raw YOLOv3 output heads into `Detections`.
+
+  Args:
+    heads: float arrays of shape (grid_height, grid_width,
+      anchors * (5 + classes)), one per output head in any order.
+    size: model input size as (width, height).
+    score_threshold: minimum objectness times class probability.
+    image_scale: resize ratio returned by `set_input`.
+    anchors: anchor (width, height) pairs in input pixels grouped per head from
+      the finest grid to the coarsest, by default `YOLOV3_ANCHORS` for three
+      heads and `YOLOV3_TINY_ANCHORS` for two, which assume the anchor masks
+      of the stock Darknet cfg files. Pass the groups of a model trained
+      with other masks.
+    iou_threshold: IoU above which boxes of the same class are suppressed.
+    class_ids: class ids to keep, None keeps every class.
+    top_k: maximum number of detections.
+  Returns:
+    `Detections` with boxes in pixels of the original image.
+  """
+  if anchors is None:
+    anchors = YOLOV3_ANCHORS if len(heads) == 3 else YOLOV3_TINY_ANCHORS
+  width, height = size
+  # Finest grid first, matching the anchor groups
+  heads = sorted(heads, key=lambda head: -head.shape[0] * head.shape[1])
+  all_boxes, all_scores, all_classes = [], [], []
+  for head, head_anchors in zip(heads, anchors):
+    head_anchors = np.asarray(head_anchors, dtype=np.float32)
+    grid_h, grid_w = head.shape[:2]
+    head = head.reshape(grid_h, grid_w, len(head_anchors), -1)
+    # Objectness bounds the score, decode only the cells passing on it
+    objectness = _sigmoid(head[..., 4])
+    rows, columns, slots = np.nonzero(objectness >= score_threshold)
+    if not len(rows):
+      continue
+    cells = head[rows, columns, slots]
+    probabilities = _sigmoid(cells[:, 5:]) * objectness[rows, columns,
+                                                        slots, None]
+    if class_ids is not None:
+      mask = np.zeros(probabilities.shape[1], dtype=bool)
+      mask[np.asarray(class_ids)] = True
+      probabilities[:, ~mask] = 0.0
+    classes = np.argmax(probabilities, axis=1)
+    scores = probabilities[np.arange(len(classes)), classes]
+    x = (_sigmoid(cells[:, 0]) + columns) * (width / grid_w)
+    y = (_sigmoid(cells[:, 1]) + rows) * (height / grid_h)
+    w, h = (np.exp(cells[:, 2:4]) * head_anchors[slots]).T
+    all_boxes.append(np.stack([x - w / 2, y - h / 2, x + w / 2, y + h / 2],
+                              axis=1))
+    all_scores.append(scores)
+    all_classes.append(classes)
+  if not all_boxes:
+    return Detections(boxes=np.zeros((0, 4), dtype=np.float32),
+                      scores=np.zeros((0,), dtype=np.float32),
+                      class_ids=np.zeros((0,), dtype=np.int32))
+
+  boxes = np.concatenate(all_boxes)
+  scores = np.concatenate(all_scores)
+  classes = np.concatenate(all_classes)
+  keep = np.flatnonzero(scores >= score_threshold)
+  if len(keep) > _MAX_NMS_CANDIDATES:
+    # Bounds the N x N IoU matrix of the suppression
+    keep = keep[np.argpartition(-scores[keep], _MAX_NMS_CANDIDATES)
+                [:_MAX_NMS_CANDIDATES]]
+  boxes, scores, classes = boxes[keep], scores[keep], classes[keep]
+  keep = non_max_suppression(boxes, scores, classes, iou_threshold, top_k)
+  image_scale_x, image_scale_y = image_scale
+  scale = np.array([image_scale_x, image_scale_y] * 2, dtype=np.float32)
+  return Detections(boxes=(boxes[keep] / scale).astype(np.float32),
+                    scores=scores[keep].astype(np.float32),
+                    class_ids=classes[keep].astype(np.int32))
+
+
+def get_yolo_output_arrays(interpreter, score_threshold,
+                           image_scale=(1.0, 1.0), anchors=None,
+                           iou_threshold=0.45, class_ids=None, top_k=100):
+  """Returns detected objects of a YOLOv3 model as `Detections`.
+
+  Quantized uint8/int8 outputs are dequantized with the quantization
+  parameters of each output tensor. See `decode_yolo` for the arguments.
+  """
+  heads = [dequantize(interpreter.get_tensor(details['index'])[0],
+                      details['quantization'])
+           for details in interpreter.get_output_details()]
+  return decode_yolo(heads, input_size(interpreter), score_threshold,
+                     image_scale, anchors, iou_threshold, class_ids, top_k)
+
+
+class InputNormalization:
+  """Writes uint8 pixels into an input tensor of any dtype in place.
+
+  The model is assumed to take real = (pixel - mean) / std. The tensor dtype
+  and quantization are read once and the matching write is chosen up front:
+
+    * uint8 without `mean` and `std`: the pixels are copied as they are, the
+      input quantization of Edge TPU models already covers the pixel range.
+    * int8 without `mean` and `std`: the pixels are shifted by -128, which is
+      the zero point change of a uint8 model converted to int8 inputs.
+    * float32: (pixel - mean) / std computed in the tensor itself, mean and std
+      default to 127.5, the range [-1, 1] of the TF object detection models.
+    * quantized with `mean` and `std`: the pixels are requantized to
+      round(real / scale + zero_point) through a float32 scratch buffer
+      allocated here, unless that reduces to a copy or a shift.
+
+  None of the writes allocates a temporary array of the frame size.
+
+  Args:
+    shape: input tensor shape as (height, width, channels).
+    dtype: input tensor dtype.
+    quantization: input tensor (scale, zero_point), scale 0 if not quantized.
+    mean: pixel value mapped to 0.
+    std: pixel range mapped to 1.
+  """
+
+  def __init__(self, shape, dtype, quantization=(0.0, 0), mean=None,
+               std=None):
+    self.dtype = np.dtype(dtype)
+    self._scratch = None
+    if self.dtype.kind == 'f':
+      mean = 127.5 if mean is None else mean
+      std = 127.5 if std is None else std
+      self.mode = 'float'
+      self._mean = np.float32(mean)
+      self._inv_std = np.float32(1.0 / std)
+      self.pad = -mean / std
+      return
+    scale, zero_point = quantization
+    if (mean is None and std is None) or not scale:
+      offset = -128 if self.dtype == np.int8 else 0
+      multiplier = 1.0
+    else:
+      multiplier = 1.0 / ((1.0 if std is None else std) * scale)
+      offset = zero_point - (0.0 if mean is None else mean) * multiplier
+    info = np.iinfo(self.dtype)
+    self._bounds = (info.min, info.max)
+    self.pad = int(np.clip(np.rint(offset), info.min, info.max))
+    if np.isclose(multiplier, 1.0) and offset == self.pad:
+      # A plain copy or shift of every pixel, no rounding needed
+      if self.dtype == np.uint8 and offset == 0:
+        self.mode = 'copy'
+        return
+      if self.dtype == np.int8 and offset == -128:
+        self.mode = 'shift'
+        return
+    self.mode = 'requantize'
+    self._multiplier = np.float32(multiplier)
+    self._offset = np.float32(offset)
+    self._scratch = np.zeros(shape, dtype=np.float32)
+
+  def write(self, region, pixels):
+    """Writes pixels of shape (h, w, channels) to the tensor view `region`."""
+    if self.mode == 'copy':
+      region[...] = pixels
+    elif self.mode == 'shift':
+      # Flipping the top bit of p as uint8 gives p - 128 as int8
+      view = region.view(np.uint8)
+      view[...] = pixels
+      np.bitwise_xor(view, 0x80, out=view)
+    elif self.mode == 'float':
+      np.copyto(region, pixels)
+      np.subtract(region, self._mean, out=region)
+      np.multiply(region, self._inv_std, out=region)
+    else:
+      h, w = pixels.shape[:2]
+      scratch = self._scratch[:h, :w]
+      np.copyto(scratch, pixels)
+      np.multiply(scratch, self._multiplier, out=scratch)
+      np.add(scratch, self._offset, out=scratch)
+      np.rint(scratch, out=scratch)
+      np.clip(scratch, *self._bounds, out=scratch)
+      np.copyto(region, scratch, casting='unsafe')
+
+
+class DetectorSession:
+  """Detection model bound to an allocated interpreter.
+
+  Tensor indices, shapes and dtypes are looked up once when the session is
+  created instead of on every frame. The interpreter refuses to invoke while
+  numpy views of its buffers are alive, so the session keeps the accessor
+  functions returned by `interpreter.tensor` and only creates views for the
+  duration of a single call.
+
+  The input padding is tracked between frames: only the part of the tensor
+  which was covered by the previous image and is not covered by the current one
+  is cleared. Anything else writing to the input tensor must call `reset`.
+
+  Float and int8 inputs are normalized in place, see `InputNormalization`.
+
+  Args:
+    interpreter: allocated Interpreter object.
+    mean: pixel value the model maps to 0, None for the dtype default.
+    std: pixel range the model maps to 1, None for the dtype default.
+  """
+
+  def __init__(self, interpreter, mean=None, std=None):
+    self.interpreter = interpreter
+    input_details = interpreter.get_input_details()[0]
+    _, height, width, channels = input_details['shape']
+    self.input_size = (int(width), int(height))
+    self.input_channels = int(channels)
+    self.input_dtype = input_details['dtype']
+    self._input = interpreter.tensor(input_details['index'])
+    self.normalization = InputNormalization(
+        (int(height), int(width), self.input_channels), self.input_dtype,
+        input_details['quantization'], mean, std)
+    output_details = interpreter.get_output_details()
+    self._outputs = [interpreter.tensor(details['index'])
+                     for details in output_details]
+    self._output_quantization = [details['quantization']
+                                 for details in output_details]
+    self.reset()
+
+  def reset(self):
+    """Fills the whole input tensor with the value of a black pixel."""
+    self._input()[0].fill(self.normalization.pad)
+    self._filled = (0, 0)
+
+  def input_tensor(self):
+    """Returns input tensor view as numpy array of shape (height, width, 3)."""
+    return self._input()[0]
+
+  def set_input(self, size, resize):
+    """Same as the module level `set_input`, without the full padding fill.
+
+    The resized image is normalized to the input dtype in place. `resize` may
+    also return a uint8 array of shape (h, w, channels).
+    """
+    width, height = self.input_size
+    w, h = size
+    scale = min(width / w, height / h)
+    w, h = int(w * scale), int(h * scale)
+    tensor = self._input()[0]
+    self.normalization.write(
+        tensor[:h, :w],
+        np.asarray(resize((w, h))).reshape(h, w, self.input_channels))
+    # Clear what the previous image covered outside the current one
+    pad = self.normalization.pad
+    filled_w, filled_h = self._filled
+    if filled_h > h:
+      tensor[h:filled_h, :filled_w] = pad
+    if filled_w > w:
+      tensor[:min(h, filled_h), w:filled_w] = pad
+    self._filled = (w, h)
+    return scale, scale
+
+  def write_frame(self, pixels):
+    """Writes a letterboxed uint8 frame of the input shape to the input.
+
+    For frames letterboxed elsewhere, e.g. in another process, with black
+    padding. The frame is normalized to the input dtype in place like in
+    `set_input`, which can be used again afterwards without `reset`.
+    """
+    self.normalization.write(self._input()[0], pixels)
+    self._filled = self.input_size
+
+  def invoke(self):
+    self.interpreter.invoke()
+
+  def get_output_arrays(self, score_threshold, image_scale=(1.0, 1.0),
+                        class_ids=None, top_k=None):
+    """Returns detected objects as `Detections`, see `get_output_arrays`."""
+    boxes, classes, scores, count = (np.squeeze(output())
+                                     for output in self._outputs[:4])
+    return _select_detections(boxes, classes, scores, int(count),
+                              self.input_size, score_threshold, image_scale,
+                              class_ids, top_k)
+
+  def get_output(self, score_threshold, image_scale=(1.0, 1.0)):
+    """Returns list of detected objects, see `get_output`."""
+    return self.get_output_arrays(score_threshold, image_scale).objects()
+
+  def get_yolo_output_arrays(self, score_threshold, image_scale=(1.0, 1.0),
+                             anchors=None, iou_threshold=0.45, class_ids=None,
+                             top_k=100):
+    """Returns detected objects of a YOLOv3 model, see `decode_yolo`."""
+    heads = [dequantize(output()[0], quantization)
+             for output, quantization in zip(self._outputs,
+                                              self._output_quantization)]
+    return decode_yolo(heads, self.input_size, score_threshold, image_scale,
+                       anchors, iou_threshold, class_ids, top_k)
@@ -0,0 +1,239 @@
+# Lint as: python3
+"""Rate controlled load for power and thermal experiments.
+
+Frames are released at a target rate following a schedule, and each frame has
+to finish before the next one is released. Waiting is done by sleeping until
+the release time, not by spinning, so the pacing itself does not load the CPU
+being measured. A frame which finishes late is recorded as a missed deadline
+and the next frame is released immediately, without trying to catch up.
+
+Schedules are given as text:
+
+  10                   constant 10 FPS (runs until stopped by a duration)
+  steps:5,10,15@30     5, 10 and 15 FPS for 30 seconds each
+  ramp:5-15@60         linear ramp from 5 to 15 FPS over 60 seconds
+"""
+
+import collections
+import time
+
+import numpy as np
+
+import power_sampler
+import stats
+
+Segment = collections.namedtuple('Segment', ['start_rate', 'end_rate',
+                                             'duration'])
+
+Frame = collections.namedtuple('Frame', ['target_rate', 'release', 'start',
+                                         'end', 'met', 'inference'])
+
+
+class Schedule:
+  """Target frame rate as a function of time since the start."""
+
+  def __init__(self, segments):
+    self.segments = list(segments)
+
+  @staticmethod
+  def parse(spec, duration=None):
+    """Returns schedule parsed from text, see the module documentation.
+
+    Args:
+      spec: schedule text.
+      duration: length of a constant rate schedule in seconds, None runs
+        forever.
+    """
+    kind, _, body = spec.partition(':')
+    if not body:
+      rate = float(kind)
+      return Schedule([Segment(rate, rate,
+                               duration if duration else float('inf'))])
+    values, _, seconds = body.partition('@')
+    seconds = float(seconds)
+    if kind == 'steps':
+      return Schedule(Segment(float(rate), float(rate), seconds)
+                      for rate in values.split(','))
+    if kind == 'ramp':
+      start_rate, end_rate = (float(rate) for rate in values.split('-'))
+      return Schedule([Segment(start_rate, end_rate, seconds)])
+    raise ValueError('Unknown schedule: ' + spec)
+
+  @property
+  def duration(self):
+    return sum(segment.duration for segment in self.segments)
+
+  def rate_at(self, elapsed):
+    """Returns target rate at `elapsed` seconds, None after the schedule."""
+    for segment in self.segments:
+      if elapsed < segment.duration:
+        fraction = elapsed / segment.duration if segment.duration else 0.0
+        return (segment.start_rate +
+                (segment.end_rate - segment.start_rate) * fraction)
+      elapsed -= segment.duration
+    return None
+
+
+def _frame_time(segment, position):
+  """Returns seconds into the segment at which frame `position` is due.
+
+  Computed from the frame count instead of summing periods, so rounding errors
+  do not add up and push frames across segment boundaries. Infinite when the
+  segment never reaches that many frames.
+  """
+  start_rate, end_rate, duration = segment
+  if position <= 0:
+    return 0.0
+  if start_rate == end_rate:
+    return position / start_rate if start_rate > 0 else float('inf')
+  # Frames due after t seconds: start_rate * t + slope * t**2 / 2
+  slope = (end_rate - start_rate) / duration
+  discriminant = start_rate ** 2 + 2 * slope * position
+  if discriminant < 0:
+    return float('inf')
+  return 2 * position / (start_rate + discriminant ** 0.5)
+
+
+def _frame_count(segment, elapsed):
+  """Returns number of frames due `elapsed` seconds into the segment."""
+  start_rate, end_rate, duration = segment
+  if start_rate == end_rate:
+    return start_rate * elapsed
+  slope = (end_rate - start_rate) / duration
+  return start_rate * elapsed + slope * elapsed ** 2 / 2
+
+
+def run_paced(schedule, work, clock=time.perf_counter, sleep=time.sleep):
+  """Calls `work` at the rate given by the schedule.
+
+  Args:
+    schedule: `Schedule` object.
+    work: function running one frame, returns the (start, end) `time.time()`
+      timestamps of its invoke call.
+    clock: monotonic clock used for pacing.
+    sleep: function sleeping for a number of seconds.
+  Returns:
+    List of `Frame`, with times relative to the start of the run.
+  """
+  frames = []
+  origin = clock()
+  segment_start = 0.0
+  end = 0.0
+  for segment in schedule.segments:
+    start_rate, end_rate, duration = segment
+    # Frame `position` of the segment is due `local` seconds into it
+    position = 0.0
+    local = 0.0
+    if end > segment_start:
+      # The previous segment's last frame ran into this one
+      local = end - segment_start
+      position = _frame_count(segment, local)
+    while local < duration:
+      rate = start_rate + (end_rate - start_rate) * (
+          local / duration if duration else 0.0)
+      if rate <= 0:
+        # Nothing is due at the idle start of a ramp
+        position = float(int(position) + 1)
+        local = _frame_time(segment, position)
+        continue
+      release = segment_start + local
+      delay = origin + release - clock()
+      if delay > 0:
+        sleep(delay)
+      start = clock() - origin
+      inference = work()
+      end = clock() - origin
+      deadline = release + 1.0 / rate
+      frames.append(Frame(rate, release, start, end, end <= deadline,
+                          inference))
+      position += 1
+      local = _frame_time(segment, position)
+      if end - segment_start > local:
+        # A late frame releases the next one immediately instead of bursting
+        local = end - segment_start
+        position = _frame_count(segment, local)
+    segment_start += duration
+  # Idle segments at the end still last their duration
+  if np.isfinite(segment_start):
+    sleep(max(0.0, origin + segment_start - clock()))
+  return frames
+
+
+def _run_energy(samples, runs, source=None):
+  """Returns (average power, joules per inference, cpu percent) of runs.
+
+  Each run is a list of contiguous frames. Energy is integrated per run, so
+  the time between runs, e.g. another step of the schedule, is left out, and
+  summed over the runs before dividing. Entries are None without power or
+  CPU samples.
+  """
+  reports = [power_sampler.energy_report(
+      samples, [frame.inference for frame in run], source) for run in runs]
+  frames = sum(report['frames'] for report in reports)
+  powered = [report for report in reports if 'energy' in report]
+  average_power = joules_per_inference = cpu_percent = None
+  if powered:
+    energy = sum(report['energy'] for report in powered)
+    duration = sum(report['duration'] for report in powered)
+    average_power = (energy / duration if duration > 0 else
+                     float(np.mean([r['average_power'] for r in powered])))
+    joules_per_inference = energy / frames
+  sampled = [report for report in reports if 'cpu_percent' in report]
+  if sampled:
+    weights = [report['duration'] for report in sampled]
+    cpu_percent = float(np.average(
+        [report['cpu_percent'] for report in sampled],
+        weights=weights if sum(weights) > 0 else None))
+  return average_power, joules_per_inference, cpu_percent
+
+
+def rate_curve(frames, samples, source=None, bin_width=1.0):
+  """Returns one row per target rate bin with achieved rate, power and latency.
+
+  A rate which appears several times in the schedule, e.g. steps:5,10,5@10,
+  gets one row, with the energy integrated over each contiguous run of its
+  frames only.
+
+  Args:
+    frames: list of `Frame` from `run_paced`.
+    samples: list of `power_sampler.Sample` recorded during the run.
+    source: optional power source overriding the sampled power.
+    bin_width: width of the target rate bins in FPS, ramps fall in several.
+  """
+  # Time from each frame's start to the next one's, the last frame counts
+  # until it ended or its period ran out
+  intervals = [after.start - frame.start
+               for frame, after in zip(frames, frames[1:])]
+  if frames:
+    intervals.append(max(frames[-1].end - frames[-1].start,
+                         1.0 / frames[-1].target_rate))
+  bins = collections.OrderedDict()
+  runs = collections.OrderedDict()
+  previous = None
+  for frame, interval in zip(frames, intervals):
+    key = round(frame.target_rate / bin_width) * bin_width
+    bins.setdefault(key, []).append((frame, interval))
+    if key != previous:
+      runs.setdefault(key, []).append([])
+      previous = key
+    runs[key][-1].append(frame)
+  rows = []
+  for target_rate, items in bins.items():
+    group = [frame for frame, _ in items]
+    span = sum(interval for _, interval in items)
+    latency = stats.summarize([frame.end - frame.start for frame in group])
+    average_power, joules_per_inference, cpu_percent = _run_energy(
+        samples, runs[target_rate], source)
+    rows.append({
+        'target_fps': target_rate,
+        'achieved_fps': len(group) / span if span > 0 else 0.0,
+        'frames': len(group),
+        'deadline_met': float(np.mean([frame.met for frame in group])),
+        'latency_p50': latency['p50'],
+        'latency_p99': latency['p99'],
+        'latency_max': latency['max'],
+        'average_power': average_power,
+        'joules_per_inference': joules_per_inference,
+        'cpu_percent': cpu_percent,
+    })
+  return rows
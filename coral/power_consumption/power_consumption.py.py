@@ -23,11 +23,17 @@ import argparse
 import time
 import csv
 
+import contextlib
+import itertools
 import os
 
 from PIL import Image, ImageDraw, ImageFont
 
 import detect
+import load_generator
+import power_sampler
+import preprocess
+import thermal_monitor
 import tflite_runtime.interpreter as tflite
 import platform
 
@@ -82,6 +88,81 @@ def draw_object(draw, obj, labels):
               fill='red')              
 
 
+def run_sampled(interpreter, image_files, input_size, args):
+  """Runs for a fixed duration while sampling power on a background thread."""
+  source = (power_sampler.SysfsPowerSource(args.power_source)
+            if args.power_source else None)
+  inferences = []
+  frames = itertools.cycle(image_files)
+  thermal = thermal_monitor.ThermalMonitor(args.sysfs_root)
+  with power_sampler.PowerSampler(source, args.sample_rate) as sampler, \
+       (thermal if args.thermal else contextlib.nullcontext()):
+    end_time = time.perf_counter() + args.duration
+    while time.perf_counter() < end_time:
+      size, converted_img = preprocess.load_image(next(frames), input_size)
+      scale = detect.set_input(interpreter, size,
+                              lambda size: converted_img.resize(size, Image.ANTIALIAS))
+      start_time = time.time()
+      interpreter.invoke()
+      inferences.append((start_time, time.time()))
+      detect.get_output(interpreter, args.threshold, scale)
+
+  meter = (power_sampler.CsvPowerSource(args.power_csv)
+           if args.power_csv else None)
+  report = power_sampler.energy_report(sampler.samples, inferences, meter)
+  if args.log:
+    power_sampler.write_log(args.log, sampler.samples, inferences)
+  if args.thermal:
+    report.update(thermal_monitor.throttling_report(
+        inferences, thermal.samples, args.thermal_window))
+  for key, value in report.items():
+    print("{}: {}".format(key, value))
+
+
+def run_paced(interpreter, image_files, input_size, args):
+  """Runs inferences at the scheduled rates and writes a rate curve."""
+  schedule = load_generator.Schedule.parse(args.schedule, args.duration)
+  if schedule.duration == float('inf'):
+    raise SystemExit('A constant rate schedule needs --duration')
+  source = (power_sampler.SysfsPowerSource(args.power_source)
+            if args.power_source else None)
+  frames = itertools.cycle(image_files)
+
+  def work():
+    size, converted_img = preprocess.load_image(next(frames), input_size)
+    scale = detect.set_input(interpreter, size,
+                            lambda size: converted_img.resize(size, Image.ANTIALIAS))
+    start_time = time.time()
+    interpreter.invoke()
+    end_time = time.time()
+    detect.get_output(interpreter, args.threshold, scale)
+    return start_time, end_time
+
+  with power_sampler.PowerSampler(source, args.sample_rate) as sampler:
+    paced_frames = load_generator.run_paced(schedule, work)
+
+  meter = (power_sampler.CsvPowerSource(args.power_csv)
+           if args.power_csv else None)
+  rows = load_generator.rate_curve(paced_frames, sampler.samples, meter)
+  if args.log:
+    power_sampler.write_log(args.log, sampler.samples,
+                            [frame.inference for frame in paced_frames])
+  with open(args.curve, mode='w') as f:
+    csv_writer = csv.DictWriter(f, fieldnames=list(rows[0]) if rows else [])
+    csv_writer.writeheader()
+    csv_writer.writerows(rows)
+  print("{:>8}{:>10}{:>10}{:>12}{:>12}{:>10}".format(
+      "Target", "Achieved", "Met (%)", "p99 (ms)", "Power (W)", "J/inf"))
+  for row in rows:
+    print("{:>8.1f}{:>10.2f}{:>10.1f}{:>12.2f}{:>12}{:>10}".format(
+        row['target_fps'], row['achieved_fps'], row['deadline_met'] * 100,
+        row['latency_p99'] * 1000,
+        '-' if row['average_power'] is None
+        else '{:.3f}'.format(row['average_power']),
+        '-' if row['joules_per_inference'] is None
+        else '{:.4f}'.format(row['joules_per_inference'])))
+
+
 def main():
   parser = argparse.ArgumentParser(
       formatter_class=argparse.ArgumentDefaultsHelpFormatter)
@@ -97,6 +178,38 @@ def main():
                       help='Score threshold for detected objects.')
   parser.add_argument('-c', '--count', type=int, default=5,
                       help='Number of times to run inference')
+  parser.add_argument('-d', '--draft', action='store_true',
+                      help='Decode JPEG images at reduced resolution, no '
+                           'smaller than the model input.')
+  parser.add_argument('--duration', type=float,
+                      help='Run for this many seconds with background '
+                           'sampling and report energy per inference, '
+                           'instead of running indefinitely.')
+  parser.add_argument('--sample_rate', type=float, default=10.0,
+                      help='Background samples per second.')
+  parser.add_argument('--power_source',
+                      help='sysfs power_supply or hwmon directory, or a file '
+                           'reporting microwatts.')
+  parser.add_argument('--power_csv',
+                      help='CSV log of an external meter covering the run, '
+                           'with time and power columns.')
+  parser.add_argument('--log',
+                      help='Write the samples and inference timestamps to '
+                           'this JSON file.')
+  parser.add_argument('--schedule',
+                      help='Pace inferences at a target rate instead of '
+                           'running flat out: a rate in FPS (run for '
+                           '--duration), steps:5,10,15@30 or ramp:5-15@60.')
+  parser.add_argument('--curve', default='rate_curve.csv',
+                      help='File path of the rate/power/latency csv file '
+                           'written with --schedule.')
+  parser.add_argument('--thermal', action='store_true',
+                      help='Sample thermal zones and CPU frequency during a '
+                           '--duration run and report throttling.')
+  parser.add_argument('--sysfs_root', default='/',
+                      help='Root of the sysfs tree read by --thermal.')
+  parser.add_argument('--thermal_window', type=float, default=10.0,
+                      help='Throughput window in seconds for --thermal.')
   args = parser.parse_args()
 
   labels = load_labels(args.labels) if args.labels else {}
@@ -106,30 +219,36 @@ def main():
   
 
   image_path = os.path.join(os.path.expanduser(args.input_folder), "*.jpg")
-  
+  input_size = detect.input_size(interpreter) if args.draft else None
+
+  if args.schedule:
+    run_paced(interpreter, sorted(glob(image_path)), input_size, args)
+    return
+  if args.duration:
+    run_sampled(interpreter, sorted(glob(image_path)), input_size, args)
+    return
   # Run Indefinitly to load the TPU or CPU constantly
   while True:
     current_run = 0
     acumulated_fps = 0
     for image_file in glob(image_path):
-      # Open Image using Context Manager to avoid problems with memory
-      with Image.open(image_file) as image:
-        # Images MUST be converted to RGB, any other mode causes a bug in the supplied detect.py
-        converted_img = image.convert('RGB')
-        
-        # Scale the Image
-        scale = detect.set_input(interpreter, converted_img.size,
-                                lambda size: converted_img.resize(size, Image.ANTIALIAS))
-        # Call the Interpreter and run the inference
-        start_time = time.perf_counter()
-        interpreter.invoke()
-        inference_time = time.perf_counter() - start_time
-
-        objs = detect.get_output(interpreter, args.threshold, scale)
-      
-        current_run += 1
-        acumulated_fps += (1.0 / inference_time)
-        print("Done with Image {}, Number of Objects {}, Current CPU Utilization: {}, FPS: {}, Running Avg FPS: {}\n".format(current_run, len(objs), psutil.cpu_percent(), 1.0 / inference_time, acumulated_fps/current_run))
+      preprocess_start_time = time.perf_counter()
+      size, converted_img = preprocess.load_image(image_file, input_size)
+
+      # Scale the Image
+      scale = detect.set_input(interpreter, size,
+                              lambda size: converted_img.resize(size, Image.ANTIALIAS))
+      preprocess_time = time.perf_counter() - preprocess_start_time
+      # Call the Interpreter and run the inference
+      start_time = time.perf_counter()
+      interpreter.invoke()
+      inference_time = time.perf_counter() - start_time
+
+      objs = detect.get_output(interpreter, args.threshold, scale)
+
+      current_run += 1
+      acumulated_fps += (1.0 / inference_time)
+      print("Done with Image {}, Number of Objects {}, Current CPU Utilization: {}, FPS: {}, Running Avg FPS: {}, Preprocess Time: {:.2f} ms\n".format(current_run, len(objs), psutil.cpu_percent(), 1.0 / inference_time, acumulated_fps/current_run, preprocess_time * 1000))
 
 if __name__ == '__main__':
   main()
@@ -0,0 +1,258 @@
+# Lint as: python3
+"""Background sampling of CPU load and power during an inference run.
+
+A `PowerSampler` runs on its own thread and records CPU utilization, CPU
+frequency and the power reported by a power source at a fixed rate, so the
+inference loop does not pay for measuring itself. Samples and inference
+timestamps share the `time.time()` clock and are joined afterwards by
+`energy_report`.
+
+Power sources are objects with a `read(timestamp)` method returning watts, or
+None when no value is available:
+
+  SysfsPowerSource: power_supply or hwmon files under /sys/class.
+  CsvPowerSource: log exported from an external USB meter.
+
+Any object with the same method can be used, e.g. a fake source in tests.
+
+The module can also be run as a script to join an inference log written by
+power_consumption.py.py with a USB meter log after the run.
+"""
+
+import argparse
+import collections
+import csv
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import psutil
+
+Sample = collections.namedtuple('Sample', ['timestamp', 'cpu_percent',
+                                           'cpu_freq', 'power'])
+
+
+def _read_number(path):
+  with open(path, 'r') as f:
+    return float(f.read().strip())
+
+
+class SysfsPowerSource:
+  """Reads power from a power_supply or hwmon directory.
+
+  Supports power_now (uW), voltage_now (uV) times current_now (uA) and hwmon
+  power1_input (uW). A file path reporting microwatts can be given directly.
+  """
+
+  def __init__(self, path):
+    self.path = path
+
+  def read(self, timestamp=None):
+    if os.path.isfile(self.path):
+      return _read_number(self.path) / 1e6
+    for name in ('power_now', 'power1_input'):
+      path = os.path.join(self.path, name)
+      if os.path.exists(path):
+        return _read_number(path) / 1e6
+    voltage = os.path.join(self.path, 'voltage_now')
+    current = os.path.join(self.path, 'current_now')
+    if os.path.exists(voltage) and os.path.exists(current):
+      return _read_number(voltage) * _read_number(current) / 1e12
+    return None
+
+
+class CsvPowerSource:
+  """Power log from an external meter, interpolated at the sample times.
+
+  Args:
+    path: CSV file with a header row.
+    time_column: column with timestamps in seconds.
+    power_column: column with power in watts. When missing, power is computed
+      from `voltage_column` times `current_column`.
+    time_offset: seconds added to the meter timestamps to bring them onto the
+      `time.time()` clock of the board.
+  """
+
+  def __init__(self, path, time_column='time', power_column='power',
+               voltage_column='voltage', current_column='current',
+               time_offset=0.0):
+    times = []
+    powers = []
+    with open(path, 'r', newline='') as f:
+      for row in csv.DictReader(f):
+        times.append(float(row[time_column]) + time_offset)
+        if power_column in row:
+          powers.append(float(row[power_column]))
+        else:
+          powers.append(float(row[voltage_column]) *
+                        float(row[current_column]))
+    order = np.argsort(times, kind='stable')
+    self.times = np.asarray(times, dtype=np.float64)[order]
+    self.powers = np.asarray(powers, dtype=np.float64)[order]
+
+  def read(self, timestamp=None):
+    if timestamp is None or not len(self.times):
+      return None
+    if timestamp < self.times[0] or timestamp > self.times[-1]:
+      return None
+    return float(np.interp(timestamp, self.times, self.powers))
+
+
+def cpu_freq():
+  """Returns current CPU frequency in MHz, or None if it is not reported."""
+  freq = psutil.cpu_freq()
+  return freq.current if freq else None
+
+
+class PowerSampler:
+  """Samples CPU utilization, frequency and power on a background thread.
+
+  Args:
+    source: power source, or None to only record CPU load.
+    rate: samples per second.
+    clock: function returning the current time, `time.time` by default.
+  """
+
+  def __init__(self, source=None, rate=10.0, clock=time.time):
+    self.source = source
+    self.period = 1.0 / rate
+    self.clock = clock
+    self.samples = []
+    self._stop = threading.Event()
+    self._thread = None
+
+  def sample(self):
+    """Records and returns one sample."""
+    timestamp = self.clock()
+    sample = Sample(timestamp, psutil.cpu_percent(interval=None), cpu_freq(),
+                    self.source.read(timestamp) if self.source else None)
+    self.samples.append(sample)
+    return sample
+
+  def _run(self):
+    # Sleep until the next deadline so the rate does not drift with the
+    # time spent sampling
+    deadline = time.perf_counter()
+    while True:
+      self.sample()
+      deadline += self.period
+      if self._stop.wait(max(0.0, deadline - time.perf_counter())):
+        break
+
+  def start(self):
+    # The first cpu_percent call only sets the reference point
+    psutil.cpu_percent(interval=None)
+    self._stop.clear()
+    self._thread = threading.Thread(target=self._run, daemon=True)
+    self._thread.start()
+    return self
+
+  def stop(self):
+    self._stop.set()
+    if self._thread is not None:
+      self._thread.join()
+      self._thread = None
+
+  def __enter__(self):
+    return self.start()
+
+  def __exit__(self, *args):
+    self.stop()
+
+
+def energy_report(samples, inferences, source=None):
+  """Joins sampled power with inference timestamps.
+
+  Args:
+    samples: list of `Sample`.
+    inferences: list of (start, end) timestamps of each invoke.
+    source: optional power source read at the sample timestamps, overriding
+      the power recorded in the samples, e.g. a `CsvPowerSource` of a meter
+      log exported after the run.
+  Returns:
+    Dictionary with frames, duration, fps, cpu and power statistics. Energy
+    entries are only present when power was available.
+  """
+  report = {'frames': len(inferences)}
+  if not inferences:
+    return report
+  start = inferences[0][0]
+  end = inferences[-1][1]
+  duration = end - start
+  report['duration'] = duration
+  report['fps'] = len(inferences) / duration if duration > 0 else 0.0
+  invoke_times = np.array([e - s for s, e in inferences])
+  report['invoke_time'] = float(invoke_times.mean())
+
+  window = [s for s in samples if start <= s.timestamp <= end]
+  if window:
+    report['cpu_percent'] = float(np.mean([s.cpu_percent for s in window]))
+    freqs = [s.cpu_freq for s in window if s.cpu_freq is not None]
+    if freqs:
+      report['cpu_freq'] = float(np.mean(freqs))
+
+  if source is not None:
+    readings = [(s.timestamp, source.read(s.timestamp)) for s in samples]
+  else:
+    readings = [(s.timestamp, s.power) for s in samples]
+  readings = [(t, p) for t, p in readings if p is not None]
+  if not readings:
+    return report
+  times, powers = (np.array(column) for column in zip(*readings))
+  # Power over the run, resampled on the sample grid inside the run window
+  grid = np.concatenate(([start], times[(times > start) & (times < end)],
+                         [end]))
+  grid_power = np.interp(grid, times, powers)
+  energy = float(np.sum((grid_power[1:] + grid_power[:-1]) / 2 *
+                        np.diff(grid)))
+  midpoints = np.array([(s + e) / 2 for s, e in inferences])
+  invoke_energy = np.interp(midpoints, times, powers) * invoke_times
+  report['average_power'] = (energy / duration if duration > 0
+                             else float(grid_power.mean()))
+  report['energy'] = energy
+  report['joules_per_inference'] = energy / len(inferences)
+  report['invoke_joules_per_inference'] = float(invoke_energy.mean())
+  return report
+
+
+def write_log(path, samples, inferences):
+  """Writes samples and inference timestamps to a JSON log."""
+  with open(path, 'w') as f:
+    json.dump({'samples': [s._asdict() for s in samples],
+               'inferences': inferences}, f)
+
+
+def read_log(path):
+  """Returns (samples, inferences) from a log written by `write_log`."""
+  with open(path, 'r') as f:
+    log = json.load(f)
+  return ([Sample(**s) for s in log['samples']],
+          [tuple(i) for i in log['inferences']])
+
+
+def main():
+  parser = argparse.ArgumentParser(
+      description='Joins an inference log with a USB meter CSV log.',
+      formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+  parser.add_argument('-l', '--log', required=True,
+                      help='Log written by power_consumption.py.py --log.')
+  parser.add_argument('-p', '--power_csv', required=True,
+                      help='CSV exported from the USB meter.')
+  parser.add_argument('--time_column', default='time',
+                      help='Meter CSV column with timestamps in seconds.')
+  parser.add_argument('--power_column', default='power',
+                      help='Meter CSV column with power in watts.')
+  parser.add_argument('--time_offset', type=float, default=0.0,
+                      help='Seconds added to meter timestamps.')
+  args = parser.parse_args()
+
+  samples, inferences = read_log(args.log)
+  source = CsvPowerSource(args.power_csv, args.time_column, args.power_column,
+                          time_offset=args.time_offset)
+  print(json.dumps(energy_report(samples, inferences, source), indent=2))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,183 @@
+# Lint as: python3
+"""Thermal throttling monitor for long runs on the Dev Board.
+
+A `ThermalMonitor` samples the thermal zones under /sys/class/thermal and the
+CPU frequencies under /sys/devices/system/cpu on a background thread. The
+sysfs root is configurable so the monitor can be pointed at a fake directory
+tree.
+
+`throttling_report` joins the samples with the per frame invoke timestamps:
+throughput is computed over fixed windows, throttling onset is the start of
+the first window after which throughput never recovers to within `tolerance`
+of the peak, and frequency onset is the first sample where the highest CPU
+frequency fell below its initial value.
+"""
+
+import collections
+import glob
+import os
+import threading
+import time
+
+import numpy as np
+
+ThermalSample = collections.namedtuple('ThermalSample', ['timestamp',
+                                                         'temperatures',
+                                                         'frequencies'])
+
+
+def _read(path):
+  try:
+    with open(path, 'r') as f:
+      return f.read().strip()
+  except OSError:
+    return None
+
+
+class ThermalMonitor:
+  """Samples temperatures (C) and CPU frequencies (MHz) at a fixed rate.
+
+  Args:
+    root: sysfs root, '/' on the board.
+    rate: samples per second.
+    clock: function returning the current time, `time.time` by default.
+  """
+
+  def __init__(self, root='/', rate=1.0, clock=time.time):
+    self.period = 1.0 / rate
+    self.clock = clock
+    self.samples = []
+    self._zones = {}
+    for zone in sorted(glob.glob(os.path.join(root, 'sys/class/thermal',
+                                              'thermal_zone*'))):
+      name = _read(os.path.join(zone, 'type')) or os.path.basename(zone)
+      self._zones[name] = os.path.join(zone, 'temp')
+    self._cpus = {}
+    for cpufreq in sorted(glob.glob(os.path.join(root, 'sys/devices/system/cpu',
+                                                 'cpu[0-9]*', 'cpufreq'))):
+      cpu = os.path.basename(os.path.dirname(cpufreq))
+      self._cpus[cpu] = os.path.join(cpufreq, 'scaling_cur_freq')
+    self._stop = threading.Event()
+    self._thread = None
+
+  def sample(self):
+    """Records and returns one sample."""
+    temperatures = {}
+    for name, path in self._zones.items():
+      value = _read(path)
+      if value:
+        # Reported in millidegrees Celsius
+        temperatures[name] = float(value) / 1000.0
+    frequencies = {}
+    for cpu, path in self._cpus.items():
+      value = _read(path)
+      if value:
+        # Reported in kHz
+        frequencies[cpu] = float(value) / 1000.0
+    sample = ThermalSample(self.clock(), temperatures, frequencies)
+    self.samples.append(sample)
+    return sample
+
+  def _run(self):
+    deadline = time.perf_counter()
+    while True:
+      self.sample()
+      deadline += self.period
+      if self._stop.wait(max(0.0, deadline - time.perf_counter())):
+        break
+
+  def start(self):
+    self._stop.clear()
+    self._thread = threading.Thread(target=self._run, daemon=True)
+    self._thread.start()
+    return self
+
+  def stop(self):
+    self._stop.set()
+    if self._thread is not None:
+      self._thread.join()
+      self._thread = None
+
+  def __enter__(self):
+    return self.start()
+
+  def __exit__(self, *args):
+    self.stop()
+
+
+def throughput_windows(inferences, window=10.0):
+  """Returns (window start times, FPS per window) relative to the first frame.
+
+  Args:
+    inferences: list of (start, end) invoke timestamps.
+    window: window length in seconds.
+  """
+  if not inferences:
+    return np.array([]), np.array([])
+  ends = np.array([end for _, end in inferences])
+  origin = inferences[0][0]
+  count = max(1, int(np.ceil((ends[-1] - origin) / window)))
+  starts = np.arange(count) * window
+  frames = np.histogram(ends - origin, bins=count,
+                        range=(0.0, count * window))[0]
+  # The last window may be partial, drop it when too short to be meaningful
+  lengths = np.minimum(window, (ends[-1] - origin) - starts)
+  if count > 1 and lengths[-1] < window / 2:
+    starts, frames, lengths = starts[:-1], frames[:-1], lengths[:-1]
+  return starts, frames / np.maximum(lengths, 1e-9)
+
+
+def throttling_report(inferences, samples, window=10.0, tolerance=0.05):
+  """Returns dictionary describing throttling during a run.
+
+  Args:
+    inferences: list of (start, end) invoke timestamps.
+    samples: list of `ThermalSample`.
+    window: throughput window length in seconds.
+    tolerance: relative drop from peak throughput counted as throttling.
+  """
+  starts, fps = throughput_windows(inferences, window)
+  report = {'frames': len(inferences)}
+  if not len(fps):
+    return report
+  origin = inferences[0][0]
+  latencies = np.array([end - start for start, end in inferences])
+  peak = float(fps.max())
+  # Throughput over the last quarter of the windows, at least one
+  sustained = float(fps[-max(1, len(fps) // 4):].mean())
+  report.update({
+      'peak_fps': peak,
+      'sustained_fps': sustained,
+      'sustained_ratio': sustained / peak if peak else 0.0,
+      'first_latency': float(latencies[:max(1, len(latencies) // 20)].mean()),
+      'last_latency': float(latencies[-max(1, len(latencies) // 20):].mean()),
+      'throttle_onset': None,
+      'frequency_onset': None,
+  })
+  below = fps < (1.0 - tolerance) * peak
+  # First window from which throughput stays below the peak
+  recovered = np.flatnonzero(~below)
+  if below[-1]:
+    onset = recovered[-1] + 1 if len(recovered) else 0
+    report['throttle_onset'] = float(starts[onset])
+
+  if samples:
+    temperatures = [max(s.temperatures.values()) for s in samples
+                    if s.temperatures]
+    if temperatures:
+      report['max_temperature'] = float(max(temperatures))
+    frequencies = [(s.timestamp, max(s.frequencies.values()))
+                   for s in samples if s.frequencies]
+    if frequencies:
+      initial = frequencies[0][1]
+      for timestamp, frequency in frequencies:
+        if frequency < initial:
+          report['frequency_onset'] = float(timestamp - origin)
+          break
+      report['min_frequency'] = float(min(f for _, f in frequencies))
+    if report['throttle_onset'] is not None and temperatures:
+      onset_time = origin + report['throttle_onset']
+      nearest = min((s for s in samples if s.temperatures),
+                    key=lambda s: abs(s.timestamp - onset_time))
+      report['onset_temperature'] = float(max(nearest.temperatures.values()))
+  return report
@@ -0,0 +1,126 @@
+import argparse
+import glob
+import os
+import time
+
+import cv2
+import numpy as np
+import tensorflow as tf
+from tensorflow.tools.graph_transforms import TransformGraph
+
+from test_frozen_graph import Object_Detection_Model
+
+INPUT_NAMES = ['image_tensor']
+OUTPUT_NAMES = ['detection_boxes', 'detection_scores', 'detection_classes', 'num_detections']
+
+
+def load_graph_def(graph_def_path):
+    graph_def = tf.compat.v1.GraphDef()
+    with tf.io.gfile.GFile(name=graph_def_path, mode='rb') as serialized_graph:
+        graph_def.ParseFromString(serialized_graph.read())
+    return graph_def
+
+
+def strip_asserts(graph_def):
+    """Removes Assert nodes and the control dependencies pointing at them."""
+    assert_names = {node.name for node in graph_def.node if node.op == 'Assert'}
+    stripped = tf.compat.v1.GraphDef()
+    stripped.versions.CopyFrom(graph_def.versions)
+    stripped.library.CopyFrom(graph_def.library)
+    for node in graph_def.node:
+        if node.name in assert_names:
+            continue
+        new_node = stripped.node.add()
+        new_node.CopyFrom(node)
+        del new_node.input[:]
+        # Inputs look like "name", "name:1" or "^name" for control dependencies
+        new_node.input.extend(name for name in node.input
+                              if name.lstrip('^').split(':')[0] not in assert_names)
+    return stripped
+
+
+def optimize_graph_def(graph_def, output_names=OUTPUT_NAMES, keep_identity=False):
+    """Strips unreachable nodes, removes Identity/Assert ops and folds constants."""
+    graph_def = tf.compat.v1.graph_util.extract_sub_graph(graph_def, output_names)
+    graph_def = strip_asserts(graph_def)
+    transforms = [] if keep_identity else ['remove_nodes(op=Identity, op=CheckNumerics)']
+    transforms.append('fold_constants(ignore_errors=true)')
+    graph_def = TransformGraph(graph_def, INPUT_NAMES, output_names, transforms)
+    # Folding leaves the replaced nodes behind, prune them again
+    return tf.compat.v1.graph_util.extract_sub_graph(graph_def, output_names)
+
+
+def measure(graph_def_path, images, runs):
+    """Returns node count, file size, import time, mean latency per image and the detections."""
+    start_time = time.perf_counter()
+    graph = Object_Detection_Model.load_graph(graph_def_path)
+    import_time = time.perf_counter() - start_time
+    node_count = len(graph.as_graph_def().node)
+
+    with Object_Detection_Model(graph_def_path) as model:
+        # The first run includes session setup, do not count it
+        detections = [model.run_detection(np.expand_dims(img, axis=0)) for img in images]
+        start_time = time.perf_counter()
+        for _ in range(runs):
+            for img in images:
+                model.run_detection(np.expand_dims(img, axis=0))
+        latency = (time.perf_counter() - start_time) / (runs * len(images))
+    return node_count, os.path.getsize(graph_def_path), import_time, latency, detections
+
+
+def detections_match(original, optimized, tolerance):
+    """Returns True if both runs give the same classes and count, and boxes and scores within tolerance."""
+    for (boxes_a, scores_a, classes_a, num_a), (boxes_b, scores_b, classes_b, num_b) in zip(original, optimized):
+        if int(num_a[0]) != int(num_b[0]):
+            return False
+        count = int(num_a[0])
+        if not np.array_equal(classes_a[0, :count], classes_b[0, :count]):
+            return False
+        if not np.allclose(boxes_a[0, :count], boxes_b[0, :count], atol=tolerance):
+            return False
+        if not np.allclose(scores_a[0, :count], scores_b[0, :count], atol=tolerance):
+            return False
+    return True
+
+
+def main():
+    argparser = argparse.ArgumentParser(description="A Python Program for optimizing a frozen tensorflow object \
+                                                    detection graph for inference. Strips unused nodes, removes \
+                                                    Identity and Assert ops and folds constants, then compares the \
+                                                    original and optimized graphs.")
+    argparser.add_argument('-m', '--model', help="Path pointing to a Tensorflow Frozen PB Graph File", required=True)
+    argparser.add_argument('-o', '--output', help="Path of the optimized PB Graph File", required=True)
+    argparser.add_argument('-i', '--images', help="Directory of jpg images used to compare the graphs", required=True)
+    argparser.add_argument('-n', '--runs', type=int, default=10, help="Number of timed runs over the images")
+    argparser.add_argument('--max_images', type=int, default=10, help="Maximum number of images used")
+    argparser.add_argument('--tolerance', type=float, default=1e-4,
+                           help="Allowed difference of boxes and scores between the graphs")
+    argparser.add_argument('--keep_identity', default=False, action='store_true',
+                           help="Do not remove Identity nodes, use if the optimized graph fails to run")
+    args = argparser.parse_args()
+
+    graph_def = optimize_graph_def(load_graph_def(args.model), keep_identity=args.keep_identity)
+    with tf.io.gfile.GFile(name=args.output, mode='wb') as f:
+        f.write(graph_def.SerializeToString())
+    print(f"Wrote optimized graph to {args.output}")
+
+    image_paths = sorted(glob.glob(os.path.join(args.images, '*.jpg')))[:args.max_images]
+    images = [img for img in (cv2.imread(path) for path in image_paths) if img is not None]
+    if not images:
+        argparser.error(f"No jpg images found in {args.images}")
+
+    original = measure(args.model, images, args.runs)
+    optimized = measure(args.output, images, args.runs)
+    print(f"{'':<22}{'Original':>14}{'Optimized':>14}")
+    print(f"{'Nodes':<22}{original[0]:>14}{optimized[0]:>14}")
+    for name, index, scale in (('File size (MB)', 1, 1 / 2**20), ('Import time (ms)', 2, 1000),
+                               ('Latency (ms)', 3, 1000)):
+        print(f"{name:<22}{original[index] * scale:>14.2f}{optimized[index] * scale:>14.2f}")
+    if detections_match(original[4], optimized[4], args.tolerance):
+        print(f"Detections match on {len(images)} images")
+    else:
+        print(f"WARNING: Detections differ on {len(images)} images, try --keep_identity")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,21 +6,34 @@ import numpy as np
 from object_detection.utils import label_map_util
 from object_detection.utils import visualization_utils as vis_util
 import argparse
+import time
 
 
 class Object_Detection_Model:
-    def __init__(self, model_path):
+    def __init__(self, model_path, inter_op_threads=0, intra_op_threads=0):
         self.graph = self.load_graph(graph_def_path=model_path)
         self.input_tensor = self.graph.get_tensor_by_name('image_tensor:0')
         self.detection_boxes = self.graph.get_tensor_by_name('detection_boxes:0')
         self.detection_scores = self.graph.get_tensor_by_name('detection_scores:0')
         self.detection_classes = self.graph.get_tensor_by_name('detection_classes:0')
         self.num_detections = self.graph.get_tensor_by_name('num_detections:0')
+        # Keep one session for the lifetime of the model instead of one per detection
+        config = tf.compat.v1.ConfigProto(inter_op_parallelism_threads=inter_op_threads,
+                                          intra_op_parallelism_threads=intra_op_threads)
+        self.session = tf.compat.v1.Session(graph=self.graph, config=config)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.session.close()
 
     @staticmethod
     def load_graph(graph_def_path):
         temp_graph = tf.Graph()
-        session = tf.InteractiveSession(graph=temp_graph)
         with temp_graph.as_default():
             with tf.io.gfile.GFile(name=graph_def_path, mode='rb') as serialized_graph:
                 graph_def = tf.compat.v1.GraphDef()
@@ -29,14 +42,58 @@ class Object_Detection_Model:
         return temp_graph
 
     def run_detection(self, image_tensor):
-        with self.graph.as_default():
-            with tf.compat.v1.Session(graph=self.graph) as session:
-                (boxes, scores, classes, num_detections) = session.run([self.detection_boxes,
-                                                                        self.detection_scores,
-                                                                        self.detection_classes,
-                                                                        self.num_detections],
-                                                                       feed_dict={self.input_tensor: image_tensor})
-                return boxes, scores, classes, num_detections
+        (boxes, scores, classes, num_detections) = self.session.run([self.detection_boxes,
+                                                                     self.detection_scores,
+                                                                     self.detection_classes,
+                                                                     self.num_detections],
+                                                                    feed_dict={self.input_tensor: image_tensor})
+        return boxes, scores, classes, num_detections
+
+    def run_batch(self, images, batch_size):
+        """Runs detection on a list of same sized images in batches of batch_size.
+
+        The last batch is padded with copies of its last image so every run sees the same batch shape,
+        the padded results are dropped. Returns the list of (boxes, scores, classes, num_detections)
+        per image.
+        """
+        results = []
+        for start in range(0, len(images), batch_size):
+            batch = images[start:start + batch_size]
+            count = len(batch)
+            batch = batch + [batch[-1]] * (batch_size - count)
+            boxes, scores, classes, num_detections = self.run_detection(np.stack(batch))
+            for i in range(count):
+                results.append((boxes[i], scores[i], classes[i], num_detections[i]))
+        return results
+
+
+def load_images_by_size(directory):
+    """Reads all jpg images in a directory and groups them by shape."""
+    images_by_size = {}
+    for image_path in sorted(glob.glob(os.path.join(directory, '*.jpg'))):
+        img = cv2.imread(image_path)
+        if img is None:
+            continue
+        images_by_size.setdefault(img.shape, []).append(img)
+    return images_by_size
+
+
+def benchmark_batches(model, directory, batch_sizes):
+    """Prints throughput of batched detection over a directory for each batch size."""
+    images_by_size = load_images_by_size(directory)
+    number_of_images = sum(len(images) for images in images_by_size.values())
+    print(f"Found {number_of_images} images in {len(images_by_size)} different sizes")
+    for batch_size in batch_sizes:
+        # Warm up so graph setup is not counted
+        for images in images_by_size.values():
+            model.run_batch(images[:1] * batch_size, batch_size)
+        start_time = time.perf_counter()
+        for images in images_by_size.values():
+            model.run_batch(images, batch_size)
+        total_time = time.perf_counter() - start_time
+        print(f"Batch size {batch_size}: {number_of_images / total_time:.2f} images/s, "
+              f"{total_time / number_of_images * 1000:.2f} ms per image")
+
 
 def main():
     # Gets pb file in current directory, chooses the first found instance if multiple are present
@@ -45,13 +102,27 @@ def main():
                                                     tensorflow object detection graph and test on an image. \
                                                     (This only works for Frozen Graphs and not TFLite Format)")
 
-    argparser.add_argument('-i', '--image', help="Path pointing to an image file", required=True)
+    argparser.add_argument('-i', '--image', help="Path pointing to an image file")
     argparser.add_argument('-m', '--model', help="Path pointing to a Tensorflow Frozen PB Graph File", required=True)
-    argparser.add_argument('-l', '--label', help="Path pointing to label file", required=True)
+    argparser.add_argument('-l', '--label', help="Path pointing to label file")
+    argparser.add_argument('-d', '--directory', help="Benchmark batched detection on the jpg images in this directory")
+    argparser.add_argument('-b', '--batch_sizes', type=int, nargs='+', default=[1, 2, 4, 8],
+                           help="Batch sizes used when benchmarking a directory")
+    argparser.add_argument('--inter_op_threads', type=int, default=0,
+                           help="Tensorflow inter-op thread pool size, 0 lets Tensorflow choose")
+    argparser.add_argument('--intra_op_threads', type=int, default=0,
+                           help="Tensorflow intra-op thread pool size, 0 lets Tensorflow choose")
     args = argparser.parse_args()
 
+    if args.directory:
+        with Object_Detection_Model(args.model, args.inter_op_threads, args.intra_op_threads) as model:
+            benchmark_batches(model, args.directory, args.batch_sizes)
+        return
+    if not args.image or not args.label:
+        argparser.error("-i/--image and -l/--label are required unless -d/--directory is given")
+
     # Define an Object Detection Model Class
-    object_detection_graph = Object_Detection_Model(args.model)
+    object_detection_graph = Object_Detection_Model(args.model, args.inter_op_threads, args.intra_op_threads)
 
     # Read in an Image using CV2, Pillow is another alternative
     img = cv2.imread('person.jpg')